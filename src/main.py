@@ -19,10 +19,13 @@
 #    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
 import sys
+import time
 import traceback
 import subprocess
 import signal
 
+START_TIME = time.monotonic()
+
 import gi
 gi.require_version('Gtk', '3.0')
 gi.require_version('Notify', '0.7')
@@ -36,6 +39,9 @@ if here != '/usr/bin':
 
 
 from yumex import YumexApplication
+from yumex.misc import TIMELINE
+TIMELINE.start(START_TIME)
+TIMELINE.mark('imports-done')
 try:
     signal.signal(signal.SIGINT, signal.SIG_DFL)
     app = YumexApplication()
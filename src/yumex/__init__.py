@@ -20,21 +20,30 @@
 
 import argparse
 import datetime
+import json
 import logging
 import os.path
 import shutil
+import signal
 import subprocess
 import sys
+import time
 
-from gi.repository import Gio, Gtk, Gdk
+from gi.repository import Gio, GLib, Gtk, Gdk
 
 from yumex.misc import _, ngettext, CONFIG
 import yumex.const as const
 import yumex.misc as misc
-import yumex.dnf_backend
-import yumex.gui.dialogs as dialogs
+import yumex.dbustrace as dbustrace
+import yumex.dnf_backend as dnf_backend
 import yumex.gui.views as views
 import yumex.gui.widgets as widgets
+from yumex.tracing import TRACER
+
+# these are not needed for the first window, but when a dialog is shown
+# or the history page is opened
+dialogs = misc.lazy_import('yumex.gui.dialogs')
+history = misc.lazy_import('yumex.history')
 
 
 logger = logging.getLogger('yumex')
@@ -45,13 +54,15 @@ class BaseYumex:
     def __init__(self):
         self._root_backend = None
         self._root_locked = False
+        self._warmup = None  # backend started by the application
         self.is_working = False
 
     def set_working(self, state, insensitive=False):
         """Set the working state."""
         self.is_working = state
 
-    def _check_cache_expired(self, cache_type):
+    @staticmethod
+    def _check_cache_expired(cache_type):
         time_fmt = '%Y-%m-%d %H:%M'
         now = datetime.datetime.now()
         refresh_period = datetime.timedelta(hours=CONFIG.conf.refresh_interval)
@@ -64,8 +75,9 @@ class BaseYumex:
             period = now - last_refresh
             return period > refresh_period
         elif cache_type == 'system':
+            # the updater might have refreshed the cache in the background
             last_refresh = datetime.datetime.strptime(
-                CONFIG.conf.system_refresh, time_fmt)
+                CONFIG.read_option('system_refresh'), time_fmt)
             period = now - last_refresh
             return period > refresh_period
 
@@ -97,6 +109,12 @@ class BaseYumex:
             dialogs.show_information(
                 self, _('Could not refresh the DNF cache (root)'))
 
+    def on_cache_expired(self):
+        """The metadata cache is expired, when locking the daemon."""
+        # packages loaded by the warmup are from the old cache
+        self._root_backend.cache.reset()
+        self.reset_cache()
+
     @misc.ExceptionHandler
     def get_root_backend(self):
         """Get the current root backend.
@@ -104,15 +122,25 @@ class BaseYumex:
         if it is not setup yet, the create it
         if it is not locked, then lock it
         """
+        warmup = None
         if self._root_backend is None:
-            self._root_backend = yumex.dnf_backend.DnfRootBackend(self)
+            if self._warmup is not None:
+                warmup, self._warmup = self._warmup, None
+                self._root_backend = self._join_warmup(warmup)
+            else:
+                self._root_backend = dnf_backend.DnfRootBackend(self)
         if self._root_locked is False:
             logger.debug('Lock the DNF root daemon')
-            locked, msg = self._root_backend.setup()
+            if warmup is not None:  # the warmup thread did the locking
+                locked, msg = warmup.locked, warmup.msg
+            else:
+                locked, msg = self._root_backend.setup()
             if locked:
                 self._root_locked = True
+                misc.TIMELINE.mark('daemon-locked')
                 if self._check_cache_expired('system'):
-                    self.reset_cache()
+                    self.on_cache_expired()
+                misc.TIMELINE.mark('metadata-ready')
             else:
                 logger.critical("can't get root backend lock")
                 if msg == 'not-authorized':  # user canceled the polkit dialog
@@ -131,6 +159,16 @@ class BaseYumex:
                 sys.exit(1)
         return self._root_backend
 
+    @misc.TimeFunction
+    def _join_warmup(self, warmup):
+        """Wait for the backend warmup thread and take over its backend."""
+        warmup.join()
+        if warmup.error:
+            raise warmup.error
+        backend = warmup.backend
+        backend.frontend = self
+        return backend
+
     @misc.ExceptionHandler
     def release_root_backend(self, quit_dnfdaemon=False):
         """Release the current root backend, if it is setup and locked."""
@@ -141,6 +179,7 @@ class BaseYumex:
             self._root_backend.Unlock()
             self._root_locked = False
         if quit_dnfdaemon:
+            self._root_backend.watcher.stop()
             logger.debug('Exit the DNF root daemon')
             self._root_backend.Exit()
 
@@ -202,15 +241,30 @@ class BaseWindow(Gtk.ApplicationWindow, BaseYumex):
         self.ui.set_translation_domain('yumex-dnf')
         try:
             self.ui.add_from_file(const.DATA_DIR + "/yumex.ui")
+            misc.TIMELINE.mark('builder-loaded')
         except:
             raise
             dialogs.show_information(
                 self, 'GtkBuilder ui file not found : ' +
                 const.DATA_DIR + '/yumex.ui')
             sys.exit()
-        # transaction result dialog
-        self.transaction_result = dialogs.TransactionResult(self)
-        self.error_dialog = dialogs.ErrorDialog(self)
+        # dialogs are created on first use
+        self._transaction_result = None
+        self._error_dialog = None
+
+    @property
+    def transaction_result(self):
+        """Transaction result dialog (created on first use)"""
+        if not self._transaction_result:
+            self._transaction_result = dialogs.TransactionResult(self)
+        return self._transaction_result
+
+    @property
+    def error_dialog(self):
+        """Error dialog (created on first use)"""
+        if not self._error_dialog:
+            self._error_dialog = dialogs.ErrorDialog(self)
+        return self._error_dialog
 
     def get_ui(self, widget_name):
         return self.ui.get_object(widget_name)
@@ -314,6 +368,7 @@ class BaseWindow(Gtk.ApplicationWindow, BaseYumex):
             if insensitive:
                 self._disable_buttons(False)
         else:
+            self.progress.cancel()  # don't show old progress again
             self.infobar.hide()
             self._set_normal_cursor()
             if insensitive:
@@ -342,7 +397,7 @@ class BaseWindow(Gtk.ApplicationWindow, BaseYumex):
 
 class Window(BaseWindow):
 
-    def __init__(self, app, gnome=True, install_mode=False):
+    def __init__(self, app, gnome=True, install_mode=False, warmup=None):
         super(Window, self).__init__(app)
         self.gnome = gnome
         self.install_mode = install_mode
@@ -360,6 +415,9 @@ class Window(BaseWindow):
         self.current_filter = None
         self._root_backend = None
         self._root_locked = False
+        self._warmup = warmup
+        self.last_activity = 0.0    # time of last user input
+        self._first_draw_id = None  # see on_first_draw
         self.search_type = 'prefix'
         self.last_search_pkgs = []
         if CONFIG.conf.archs:
@@ -376,9 +434,12 @@ class Window(BaseWindow):
         else:
             self._setup_gui()
             self.show_all()
+            misc.TIMELINE.mark('window-shown')
             self._setup_arch()
             # setup default selections
             self.pkg_filter.set_active('updates')
+            self.backend.preloader.start()
+            self.backend.watcher.start()
 
     def legacy_cleanup(self):
         """ Cleanup yumex-dnf 4.1.X leftovers"""
@@ -423,6 +484,13 @@ class Window(BaseWindow):
         self.resize(width, height)
         self._reset()
 
+    @property
+    def preferences(self):
+        """Preferences dialog (created on first use)"""
+        if not getattr(self, '_preferences', None):
+            self._preferences = dialogs.Preferences(self)
+        return self._preferences
+
     def _setup_gui_installmode(self):
         """setup minimal gui for doing actions from the cmd line."""
         self.set_default_size(50, 50)
@@ -430,6 +498,7 @@ class Window(BaseWindow):
         self.add(box)
         box.pack_start(self.get_ui('main_box'), False, True, 0)
         self.infobar = widgets.InfoProgressBar(self.ui)
+        self.progress = widgets.ProgressAggregator(self.infobar)
         self.show_all()
 
     def _setup_gui(self):
@@ -499,13 +568,15 @@ class Window(BaseWindow):
         color_normal = misc.get_style_color(self.package_view)
         CONFIG.conf.color_normal = misc.color_to_hex(color_normal)
         logger.debug('theme color : %s' % misc.color_to_hex(color_normal))
+        misc.update_action_colors()
 
         # infobar
         self.infobar = widgets.InfoProgressBar(self.ui)
+        self.progress = widgets.ProgressAggregator(self.infobar)
         self.infobar.hide()
 
-        # preferences dialog
-        self.preferences = dialogs.Preferences(self)
+        # preferences dialog, created on first use
+        self._preferences = None
 
         # main menu setup
         self.main_menu = widgets.MainMenu(self)
@@ -531,6 +602,7 @@ class Window(BaseWindow):
         queue_menu = self.get_ui('queue_menu')
         self.queue_view = views.QueueView(queue_menu)
         self.queue_view.connect('queue-refresh', self.on_queue_refresh)
+        self.queue_view.connect('pkgs-removed', self.on_queue_pkgs_removed)
         # Queue Page
         sw = self.get_ui('queue_sw')
         sw.add(self.queue_view)
@@ -540,8 +612,13 @@ class Window(BaseWindow):
         self.package_view = views.PackageView(self.queue_view)
         self.package_view.connect(
             'pkg_changed', self.on_pkg_view_selection_changed)
+        self.package_view.connect('pkgs-changed', self.on_view_pkgs_changed)
         sw = self.get_ui('package_sw')
         sw.add(self.package_view)
+        # track user activity, so background work can wait for idle
+        self.connect('key-press-event', self.on_user_activity)
+        for sig_name in ['button-press-event', 'scroll-event']:
+            self.package_view.connect(sig_name, self.on_user_activity)
         # setup info view
         self.info = widgets.PackageInfo(self, self)
         self.extra_filters = widgets.ExtraFilters(self)
@@ -555,6 +632,7 @@ class Window(BaseWindow):
         hb.set_direction(Gtk.Orientation.HORIZONTAL)
         self.groups = views.GroupView(self.queue_view, self)
         self.groups.connect('group-changed', self.on_group_changed)
+        self.groups.connect('row-expanded', self.on_group_category_expanded)
         #hb.pack_start(self.groups, True, True, 0)
         # sw.add(hb)
         sw.add(self.groups)
@@ -563,18 +641,30 @@ class Window(BaseWindow):
             self.queue_view, group_mode=True)
         self.group_package_view.connect(
             'pkg_changed', self.on_group_pkg_view_selection_changed)
+        self.group_package_view.connect('pkgs-changed',
+                                        self.on_view_pkgs_changed)
         sw.add(self.group_package_view)
 
+    @property
+    def history_mirror(self):
+        """Local mirror of the dnf history (created on first use)"""
+        if self._history_mirror is None:
+            self._history_mirror = history.HistoryMirror()
+        return self._history_mirror
+
     def _setup_history_page(self):
         """Setup the history page."""
         right_sw = self.get_ui('history_right_sw')
         left_sw = self.get_ui('history_left_sw')
+        self._history_mirror = None  # created when the history is shown
         self.history_view = views.HistoryView(self)
         left_sw.add(self.history_view)
         right_sw.add(self.history_view.pkg_view)
         # setup history buttons
         undo = self.get_ui('history_undo')
         undo.connect('clicked', self.on_history_undo)
+        search = self.get_ui('history_search')
+        search.connect('search-changed', self.on_history_search)
 
 ###############################################################################
 # Helpers
@@ -596,8 +686,12 @@ class Window(BaseWindow):
         self.last_search = data
         self.set_working(True)
         newest_only = CONFIG.session.newest_only
-        self.last_search_pkgs = self.backend.get_packages_by_name(
-            search_flt % data, newest_only)
+        if self.backend.refresher.running:  # the daemon is busy
+            self.last_search_pkgs = self.backend.search_cache(
+                name_key=search_flt % data)
+        else:
+            self.last_search_pkgs = self.backend.get_packages_by_name(
+                search_flt % data, newest_only)
         logger.debug('Packages found : %d' % len(self.last_search_pkgs))
         self.info.set_package(None)
         self.set_working(False)
@@ -608,8 +702,12 @@ class Window(BaseWindow):
         self.last_search = data
         self.set_working(True, True)
         newest_only = CONFIG.session.newest_only
-        self.last_search_pkgs = self.backend.search(
-            fields, data.split(' '), True, newest_only, True)
+        if self.backend.refresher.running:  # the daemon is busy
+            self.last_search_pkgs = self.backend.search_cache(
+                keys=data.split(' '))
+        else:
+            self.last_search_pkgs = self.backend.search(
+                fields, data.split(' '), True, newest_only, True)
         self.info.set_package(None)
         self.set_working(False)
         self.pkg_filter.set_active('all')
@@ -644,12 +742,22 @@ class Window(BaseWindow):
         self.set_working(False)
 
     @misc.ExceptionHandler
-    def _reset(self):
-        """Reset the gui on transaction completion."""
+    def _reset(self, transaction=None):
+        """Reset the gui on transaction completion.
+
+        If the transaction result is given, the package cache is updated
+        with the changes, instead of being reloaded.
+        """
         self.set_working(True)
         self.infobar.info(_("Reloading package information..."))
         self.release_root_backend()
-        self.backend.reload()
+        if transaction:
+            self.backend.apply_transaction(transaction)
+        else:
+            self.backend.reload()
+        # the rpmdb changes was made by us
+        self.backend.watcher.ignore_changes()
+        self._reset_history()
         # clear the package queue
         self.queue_view.queue.clear()
         self.queue_view.refresh()
@@ -664,6 +772,33 @@ class Window(BaseWindow):
         # show updates
         self.content.select_page('packages')
         self.pkg_filter.set_active('updates')
+        self.backend.preloader.start()
+
+    @misc.ExceptionHandler
+    def _change_repos(self, enabled_before, enabled_now):
+        """Update the gui when the enabled repositories is changed."""
+        self.set_working(True, True)
+        self.infobar.info(_("Reloading package information..."))
+        removed = self.backend.change_enabled_repos(enabled_before,
+                                                    enabled_now)
+        # packages from disabled repos can't be in the queue
+        for pkg in removed:
+            if pkg.queued:
+                self.queue_view.queue.remove(pkg, pkg.queued)
+                pkg.queued = None
+                pkg.selected = False
+        self.queue_view.refresh()
+        # clear search entry
+        self.last_search = None
+        self.search_bar.reset()
+        # groups depends on the enabled repos
+        if self._grps:
+            self._grps = self.backend.get_groups()
+            self.groups.populate(self._grps)
+            self.group_package_view.populate([])
+        self.set_working(False)
+        self.on_filter_changed(self.pkg_filter, self.pkg_filter.current)
+        self.backend.preloader.start()
 
     def _load_groups(self):
         """Load groups into group cache and populate group view."""
@@ -675,9 +810,16 @@ class Window(BaseWindow):
     def _load_history(self):
         """Load history and populate view."""
         if not self.history_view.is_populated:
-            result = self.backend.GetHistoryByDays(
-                0, CONFIG.conf.history_days)
-            self.history_view.populate(result)
+            days = CONFIG.conf.history_days
+            self.history_mirror.sync(self.backend, days)
+            self.history_view.populate(
+                self.history_mirror.get_transactions(days))
+
+    def _reset_history(self):
+        """A transaction was done, reload the history when shown."""
+        self.history_view.reset()
+        if self.active_page == 'history':
+            self._load_history()
 
     def _refresh(self):
         """Refresh package view, when arch filter is changed"""
@@ -771,7 +913,9 @@ class Window(BaseWindow):
         self.content.select_page('actions')
         self._populate_transaction()
         self.infobar.info(_('Searching for dependencies'))
+        self.backend.timer.start_depsolve()
         rc, result = self.backend.BuildTransaction()
+        self.backend.timer.end_depsolve()
         self.infobar.info(_('Dependencies resolved'))
         if not rc:
             raise misc.TransactionSolveError(result)
@@ -784,10 +928,15 @@ class Window(BaseWindow):
             raise misc.TransactionSolveError(result)
         return result
 
-    def _run_transaction(self):
-        """Run the current transaction."""
+    def _run_transaction(self, transaction):
+        """Run the current transaction.
+
+        :param transaction: the transaction result, confirmed by the user
+        """
         self.infobar.info(_('Applying changes to the system'))
         self.set_working(True, True)
+        self.backend.timer.begin(transaction)
+        self.backend.estimator.begin(transaction)
         rc, result = self.backend.RunTransaction()
         # This can happen more than once (more gpg keys to be
         # imported)
@@ -814,6 +963,8 @@ class Window(BaseWindow):
                     self, _('Error checking package signatures\n'),
                     '\n'.join(result))
                 break
+        self.backend.timer.finish(rc)
+        self.backend.estimator.finish(rc == 0)
 
         if rc == 4:  # Download errors
             dialogs.show_information(
@@ -829,8 +980,9 @@ class Window(BaseWindow):
                 ngettext('Error in transaction\n',
                          'Errors in transaction\n', len(result)),
                 '\n'.join(result))
-        self._reset()
-        return
+            self._reset()
+            return
+        self._reset(transaction)
 
     @misc.ExceptionHandler
     def _process_actions_installmode(self, action, package, always_yes,
@@ -912,7 +1064,7 @@ class Window(BaseWindow):
             self.transaction_result.populate(result, '')
             ok = self.transaction_result.run()
             if ok:  # Ok pressed
-                self._run_transaction()
+                self._run_transaction(result)
             else:  # user cancelled transaction
                 self._reset_on_cancel()
                 return
@@ -995,9 +1147,12 @@ class Window(BaseWindow):
     def on_mainmenu(self, widget, action, data):
         """Handle mainmenu actions"""
         if action == 'pref':
-            need_reset = self.preferences.run()
-            if need_reset:
-                self._reset()
+            self.preferences.run()
+            if self.preferences.repo_change:
+                self._change_repos(*self.preferences.repo_change)
+            if self.preferences.colors_changed:
+                self.package_view.refresh_colors()
+                self.group_package_view.refresh_colors()
         elif action == 'quit':
             if self.can_close():
                 self.app.quit()
@@ -1022,8 +1177,25 @@ class Window(BaseWindow):
             logger.debug('newest_only changed : %s' % para)
             self._refresh()
 
+    def _wait_for_refresh(self):
+        """Tell the user to wait, if the metadata is being refreshed.
+
+        A transaction can't run while the refresh replaces the cached
+        packages.
+
+        :return: True if the refresh is running
+        """
+        if self.backend.refresher.running:
+            dialogs.show_information(
+                self, _('Refreshing Repository Metadata'),
+                _('Please wait until the refresh is completed'))
+            return True
+        return False
+
     def on_apply_changes(self, widget):
         """Apply Changes button callback."""
+        if self._wait_for_refresh():
+            return
         self._process_actions()
 
     def on_page_changed(self, widget, page):
@@ -1039,6 +1211,8 @@ class Window(BaseWindow):
         if page == 'groups':
             self._load_groups()
             self.info.show()
+            self.backend.prefetch_group_packages(
+                self.groups.get_expanded_groups())
         elif page == 'history':
             self._load_history()
         self.active_page = page
@@ -1063,26 +1237,27 @@ class Window(BaseWindow):
 
     def on_filter_changed(self, widget, data):
         """Handle changes in package filter."""
+        with TRACER.span('filter-change', flt=data):
+            self._filter_changed(data)
+
+    def _filter_changed(self, data):
+        """Show the packages for a package filter."""
         self.infobar.info(const.PACKAGE_LOAD_MSG[data])
         self.set_working(True, True)
         if self.last_search:  # we are searching
             pkgs = self._filter_search_pkgs(data)
         else:  # normal package filter
             self.current_filter = self.pkg_filter.current
-            pkgs = self.backend.get_packages(data)
+            pkgs = self._get_filter_pkgs(data)
             if data == 'updates':
-                if CONFIG.session.newest_only:
-                    pkgs = self.backend.get_packages(data)
-                else:
-                    pkgs = self.backend.get_packages('updates_all')
-                obs_pkgs = self.backend.get_packages('obsoletes')
-                pkgs.extend(obs_pkgs)
-            else:
-                pkgs = self.backend.get_packages(data)
+                misc.TIMELINE.mark('updates-fetched')
             #self.status.SetUpdateCount(len(pkgs))
         self.info.set_package(None)
         self.infobar.info(_('Adding packages to view'))
         self.package_view.populate(pkgs)
+        if self._first_draw_id is None:
+            self._first_draw_id = self.package_view.connect(
+                'draw', self.on_first_draw)
         self.set_working(False)
         self.infobar.hide()
         if data == 'updates':
@@ -1090,6 +1265,129 @@ class Window(BaseWindow):
         else:
             self.package_view.set_header_click(False)
 
+    def _get_filter_pkgs(self, data):
+        """Get the packages to show for a package filter."""
+        if data == 'updates':
+            if CONFIG.session.newest_only:
+                pkgs = self.backend.get_packages(data)
+            else:
+                pkgs = self.backend.get_packages('updates_all')
+            obs_pkgs = self.backend.get_packages('obsoletes')
+            pkgs.extend(obs_pkgs)
+        else:
+            pkgs = self.backend.get_packages(data)
+        return pkgs
+
+    def on_first_draw(self, widget, cairo_ctx):
+        """The first package list is drawn, startup is complete."""
+        if self._first_draw_id:
+            self.package_view.disconnect(self._first_draw_id)
+            self._first_draw_id = 0  # only once
+        misc.TIMELINE.mark('first-rows-visible')
+        if self.app.args.benchmark_startup:
+            timeline = misc.TIMELINE.as_dict()
+            timeline['version'] = const.VERSION
+            print(json.dumps(timeline, indent=2))
+            self.app.quit()
+        return False
+
+    def on_cache_changed(self, flt):
+        """Packages for a filter changed in the background (revalidation),
+        update the package view, if it shows them.
+
+        The view keeps its sort order, cursor and scroll position.
+        """
+        if self.is_working or self.last_search:
+            return
+        current = self.pkg_filter.current
+        if flt == current or current == 'all' or \
+                (current == 'updates' and flt == 'obsoletes'):
+            self.package_view.repopulate(self._get_filter_pkgs(current))
+
+    def on_rpmdb_changed(self):
+        """The rpmdb was changed outside yumex.
+
+        Relock the daemon, so it sees the changes, and update the
+        installed packages and updates in the background.
+        """
+        if self.backend.refresher.running:
+            return  # all the packages are reloaded, when it is done
+        # the relock reads the rpmdb, don't see that as a new change
+        self.backend.watcher.ignore_changes()
+        self.release_root_backend()
+        self.backend.preloader.revalidate(['installed', 'updates',
+                                           'obsoletes'])
+        self.backend.watcher.ignore_changes()
+        self._reset_history()
+
+    def on_cache_expired(self):
+        """Refresh the metadata in the background, the current package
+        lists are shown until it is done.
+        """
+        if self.install_mode:
+            BaseYumex.on_cache_expired(self)
+        else:  # after the first package list is shown
+            GLib.idle_add(self.reset_cache, priority=GLib.PRIORITY_LOW)
+
+    def reset_cache(self):
+        """Refresh the metadata without blocking the gui."""
+        if self.install_mode:
+            BaseYumex.reset_cache(self)
+        else:
+            logger.debug('Refresh system cache (background)')
+            self.infobar.info(_('Refreshing Repository Metadata'))
+            self.backend.refresher.start()
+        return False
+
+    def on_metadata_refreshed(self, success, new_updates, removed):
+        """The background metadata refresh is completed.
+
+        :param success: the metadata was refreshed
+        :param new_updates: number of new updates, None if the packages
+                            is still being updated
+        :param removed: packages no longer available
+        """
+        self.progress.cancel()
+        if not success:
+            self.infobar.hide()
+            dialogs.show_information(
+                self, _('Could not refresh the DNF cache (root)'))
+            return
+        self._set_cache_refreshed('system')
+        # packages no longer available can't be in the queue
+        for pkg in removed:
+            if pkg.queued:
+                self.queue_view.queue.remove(pkg, pkg.queued)
+                pkg.queued = None
+                pkg.selected = False
+        self.queue_view.refresh()
+        if self._grps:
+            self._grps = self.backend.get_groups()
+            self.groups.populate(self._grps)
+            self.group_package_view.populate([])
+        self.on_cache_changed(self.pkg_filter.current)
+        self.backend.preloader.start()
+        if new_updates is None:  # the packages is updated in background
+            msg = _('Repository metadata refreshed')
+        elif new_updates:
+            msg = ngettext('%d new update', '%d new updates',
+                           new_updates) % new_updates
+        else:
+            msg = _('No new updates')
+        logger.debug('Metadata refreshed : %s', msg)
+        self.infobar.info(msg)
+        GLib.timeout_add_seconds(5, self._hide_infobar)
+
+    def _hide_infobar(self):
+        if not self.is_working:
+            self.infobar.hide()
+        return False
+
+    def on_user_activity(self, *args):
+        """Remember the time of the latest user input."""
+        self.last_activity = time.monotonic()
+        return False
+
     def on_queue_refresh(self, widget, total):
         '''Handle content of the queue is changed.'''
         if total > 0:
@@ -1097,6 +1395,19 @@ class Window(BaseWindow):
         else:
             self.apply_button.set_sensitive(False)
 
+    def on_queue_pkgs_removed(self, widget, pkgs):
+        """Packages removed from the queue, update the package views."""
+        self.package_view.refresh_packages(pkgs)
+        self.group_package_view.refresh_packages(pkgs)
+
+    def on_view_pkgs_changed(self, widget, pkgs):
+        """Packages toggled in a package view, update the other view,
+        it can show the same packages.
+        """
+        for view in (self.package_view, self.group_package_view):
+            if view is not widget:
+                view.refresh_packages(pkgs)
+
     def on_pkg_view_selection_changed(self, widget, pkg):
         """Handle package selection on package page."""
         self.info.set_package(pkg)
@@ -1113,8 +1424,20 @@ class Window(BaseWindow):
         self.group_package_view.populate(pkgs)
         self.set_working(False)
 
+    def on_group_category_expanded(self, widget, iterator, path):
+        """Load the packages for the groups in a category in background."""
+        model = widget.get_model()
+        grp_ids = [row[0].id for row in model[path].iterchildren()]
+        self.backend.prefetch_group_packages(grp_ids)
+
+    def on_history_search(self, widget):
+        """Find the history transactions with a package."""
+        self.history_view.search(widget.get_text().strip())
+
     def on_history_undo(self, widget):
         """Handle the undo button on history page."""
+        if self._wait_for_refresh():
+            return
         tid = self.history_view.get_selected()
         logger.debug('History Undo : %s', tid)
         rc, messages = self.backend.HistoryUndo(tid)
@@ -1149,8 +1472,16 @@ class YumexApplication(Gtk.Application):
 
     def on_activate(self, app):
         if not self.running:
+            # get the dnf daemon ready while the gui is being build
+            if self.install_mode:
+                prefetch = []
+            else:
+                prefetch = ['updates', 'obsoletes']
+            warmup = dnf_backend.BackendWarmup(prefetch)
+            warmup.start()
             self.window = Window(self, gnome=CONFIG.conf.headerbar,
-                                 install_mode=self.install_mode)
+                                 install_mode=self.install_mode,
+                                 warmup=warmup)
             app.add_window(self.window)
             self.running = True
             self.window.show()
@@ -1178,6 +1509,18 @@ class YumexApplication(Gtk.Application):
         parser.add_argument(
             '--updateall', action='store_true',
             help='apply all available updates')
+        parser.add_argument(
+            '--benchmark-startup', action='store_true',
+            help='print the startup timeline as JSON and exit, '
+                 'when the first package list is shown')
+        parser.add_argument(
+            '--profile', nargs='?', metavar='FILE',
+            const=os.path.join(CONFIG.conf_dir, 'yumex-profile.json'),
+            help='record profiling spans and write them as a Chrome '
+                 'trace-event file on exit')
+        parser.add_argument(
+            '--dbus-stacks', action='store_true',
+            help='record the callers of the D-Bus calls to the dnf daemon')
         if not self.running:
             # First run
             self.args = parser.parse_args(args.get_arguments()[1:])
@@ -1189,6 +1532,13 @@ class YumexApplication(Gtk.Application):
                 misc.logger_setup(loglvl=logging.DEBUG)
             else:
                 misc.logger_setup()
+            if self.args.profile:
+                TRACER.enable()
+            if self.args.debug or self.args.dbus_stacks:
+                # summary on exit, live dump with 'kill -USR1 <pid>'
+                dbustrace.TRACER.enable(capture_stack=self.args.dbus_stacks)
+                GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGUSR1,
+                                     self.on_sigusr1)
             if self.args.install or self.args.remove or self.args.updateall:
                 self.install_mode = True
         else:
@@ -1207,6 +1557,22 @@ class YumexApplication(Gtk.Application):
         self.activate()
         return 0
 
+    def on_sigusr1(self):
+        """Dump the D-Bus call statistics."""
+        dbustrace.TRACER.dump()
+        return True
+
+    @staticmethod
+    def _write_profile(path):
+        """Write the profiling spans and log the summary."""
+        try:
+            TRACER.export(path)
+            logger.info('Profile written to %s', path)
+        except OSError as e:
+            logger.error('Could not write profile %s : %s', path, e)
+        for line in TRACER.summary():
+            logger.info(line)
+
     def on_shutdown(self, app):
         if self.window and not self.install_mode:
             CONFIG.conf.info_paned = self.window.main_paned.get_position()
@@ -1217,6 +1583,12 @@ class YumexApplication(Gtk.Application):
                 CONFIG.conf.win_height = self.window.cur_height
                 CONFIG.conf.win_maximized = False
             self.window.release_root_backend(quit_dnfdaemon=True)
+            if self.window._history_mirror:
+                self.window._history_mirror.save()
         logger.info('Saving config on exit')
         CONFIG.write()
+        if self.args and self.args.profile:
+            self._write_profile(self.args.profile)
+        if dbustrace.TRACER.enabled:
+            dbustrace.TRACER.dump()
         return 0
@@ -202,6 +202,8 @@ class PackageCache:
             setattr(self, flt, set())
         self._populated = []
         self._index = {}
+        self._repos = {}  # repo_id -> packages from the repo
+        self._mirrors = {}  # str(po) -> {repo_id: po} from the other repos
 
     def reset(self):
         '''
@@ -211,6 +213,8 @@ class PackageCache:
             setattr(self, flt, set())
         self._populated = []
         self._index = {}
+        self._repos = {}  # repo_id -> packages from the repo
+        self._mirrors = {}  # str(po) -> {repo_id: po} from the other repos
 
     def _get_packages(self, pkg_filter):
         '''
@@ -227,17 +231,105 @@ class PackageCache:
         '''
         '''
         self.find_packages(pkgs)
-        self._populated.append(str(pkg_filter))
+        self.set_populated(pkg_filter)
+
+    def set_populated(self, pkg_filter):
+        '''
+        mark a package filter as loaded, used when the packages has been
+        added in chunks with find_packages
+        @param pkg_filter: the type of packages
+        '''
+        if not self.is_populated(pkg_filter):
+            self._populated.append(str(pkg_filter))
 
     def _add(self, po):
         if str(po) in self._index:  # package is in cache
-            return self._index[str(po)]
+            cached = self._index[str(po)]
+            if po.repository != cached.repository:
+                # same nevra in more repos, keep the other package, so it
+                # can replace the cached one, if its repo is disabled
+                self._mirrors.setdefault(str(po), {})[po.repository] = po
+            return cached
         else:
             target = getattr(self, const.ACTIONS_FILTER[po.action])
             self._index[str(po)] = po
             target.add(po)
+            self._repos.setdefault(po.repository, set()).add(po)
             return po
 
+    def _remove(self, po):
+        if self._index.get(str(po)) is po:
+            del self._index[str(po)]
+        getattr(self, const.ACTIONS_FILTER[po.action]).discard(po)
+        self._repos.get(po.repository, set()).discard(po)
+
+    def get_package(self, key):
+        '''
+        get a package from the cache by its key (str(po))
+        @return: the package or None, if not in the cache
+        '''
+        return self._index.get(key)
+
+    def remove_package(self, po):
+        '''
+        remove a package from the cache
+        '''
+        self._remove(po)
+
+    def update_package(self, po, **attrs):
+        '''
+        change attributes of a cached package (fx. action or repository),
+        keeping the filter sets, repo partitions and index in sync
+        '''
+        self._remove(po)
+        for attr, value in attrs.items():
+            setattr(po, attr, value)
+        return self._add(po)
+
+    def drop_repo(self, repo_id):
+        '''
+        remove the packages from a repository from the cache,
+        packages also in another repository is replaced by the package
+        from that repository
+        @param repo_id: the repository id
+        @return: list of the removed packages
+        '''
+        for key in list(self._mirrors):
+            self._mirrors[key].pop(repo_id, None)
+            if not self._mirrors[key]:
+                del self._mirrors[key]
+        pkgs = list(self._repos.pop(repo_id, []))
+        for po in pkgs:
+            self._remove(po)
+            others = self._mirrors.get(str(po))
+            if others:
+                self._add(others.pop(sorted(others)[0]))
+                if not others:
+                    del self._mirrors[str(po)]
+        return pkgs
+
+    def replace(self, pkg_filter, packages):
+        '''
+        replace the packages for a filter with a new list,
+        packages already in the cache are kept.
+        @param pkg_filter: the type of packages
+        @param packages: the new list of packages
+        @return: (added, removed) packages
+        '''
+        current = set(getattr(self, str(pkg_filter)))
+        new = set()
+        for po in packages:
+            cached = self._index.get(str(po))
+            if cached is not None and (cached.action != po.action or
+                                       cached.repository != po.repository):
+                self._remove(cached)  # outdated, fx. by a transaction
+            new.add(self._add(po))
+        removed = current - new
+        for po in removed:
+            self._remove(po)
+        self.set_populated(pkg_filter)
+        return list(new - current), list(removed)
+
     # @TimeFunction
     def find_packages(self, packages):
         pkgs = []
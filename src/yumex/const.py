@@ -18,13 +18,10 @@
 #    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
 
-import os.path
+import os
 import re
-import subprocess
 import sys
 
-import hawkey
-
 from yumex.misc import _
 
 VERSION = "4.4.0"
@@ -49,8 +46,20 @@ SYS_DESKTOP_FILE = MISC_DIR + "/yumex-dnf-updater.desktop"
 LEGACY_DESKTOP_FILE = AUTOSTART_DIR + "/yumex-dnf.desktop"
 
 
-ARCH = subprocess.check_output(
-    '/usr/bin/rpm --eval %_arch', shell=True).decode("utf-8")[:-1]
+def _get_base_arch():
+    """Get the rpm base arch (%_arch) from the machine type.
+
+    This is much cheaper than asking rpm about it at startup.
+    """
+    machine = os.uname().machine
+    if machine in ('i386', 'i486', 'i586', 'i686', 'athlon', 'geode'):
+        return 'i386'
+    elif machine.startswith('arm'):
+        return 'arm'
+    return machine
+
+
+ARCH = _get_base_arch()
 
 ARCH_DICT = {
     "x86_64": set(['x86_64', 'i686', 'i386', 'noarch']),
@@ -158,9 +167,22 @@ WIDGETS_INSENSITIVE = ["header_menu", "header_filters",
 FEDORA_REPOS = ['fedora', 'updates', 'updates-testing', 'rawhide']
 
 
-ADVISORY_TYPES = {
-    hawkey.ADVISORY_BUGFIX: _('Bugfix'),
-    hawkey.ADVISORY_UNKNOWN: _('New Package'),
-    hawkey.ADVISORY_SECURITY: _('Security'),
-    hawkey.ADVISORY_ENHANCEMENT: _('Enhancement')
-}
+_ADVISORY_TYPES = None
+
+
+def get_advisory_types():
+    """Get the advisory type labels.
+
+    hawkey is first imported here, when updateinfo is shown,
+    so we don't have to pay for loading it at startup.
+    """
+    global _ADVISORY_TYPES
+    if _ADVISORY_TYPES is None:
+        import hawkey
+        _ADVISORY_TYPES = {
+            hawkey.ADVISORY_BUGFIX: _('Bugfix'),
+            hawkey.ADVISORY_UNKNOWN: _('New Package'),
+            hawkey.ADVISORY_SECURITY: _('Security'),
+            hawkey.ADVISORY_ENHANCEMENT: _('Enhancement')
+        }
+    return _ADVISORY_TYPES
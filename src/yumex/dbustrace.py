@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+#    Yum Exteder (yumex) - A graphic package management tool
+#    Copyright (C) 2013 -2014 Tim Lauridsen < timlau<AT>fedoraproject<DOT>org >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+D-Bus call tracer for the dnf daemon.
+
+When enabled (yumex --debug), the dnfdaemon.client.Client methods used by
+the root backend and the raw calls on its D-Bus proxy are counted, with
+latency and payload size (and optional the callers).
+The payload size is measured on the D-Bus values (fx. the json strings),
+the calls made by a client method are counted for that method.
+The summary is logged on exit and when yumex gets SIGUSR1.
+"""
+
+import logging
+import os.path
+import sys
+import threading
+import time
+
+logger = logging.getLogger('yumex.dbustrace')
+
+# dnfdaemon.client.Client methods used by DnfRootBackend
+CLIENT_METHODS = [
+    'AddTransaction', 'BuildTransaction', 'ClearTransaction',
+    'ConfirmGPGImport', 'Exit', 'ExpireCache', 'GetAttribute',
+    'GetGroupPackages', 'GetGroups', 'GetHistoryByDays',
+    'GetHistoryPackages', 'GetPackages', 'GetPackagesByName',
+    'GetRepositories', 'GetTransaction', 'GroupInstall', 'GroupRemove',
+    'HistoryUndo', 'Install', 'Lock', 'Remove', 'RunTransaction', 'Search',
+    'SetConfig', 'SetEnabledRepos', 'SetWatchdogState', 'Unlock', 'Update']
+
+MAX_SAMPLES = 10000  # latencies kept per method
+STACK_DEPTH = 3  # caller frames to record
+SKIP_FILES = (os.path.abspath(__file__), 'dnfdaemon')
+CLIENT_FILE = os.path.join('dnfdaemon', 'client')
+
+
+def payload_size(value):
+    """Size of a D-Bus argument or result, strings (fx. json) by their
+    length, other values approximated.
+    """
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, (list, tuple)):
+        return sum(payload_size(elem) for elem in value)
+    if isinstance(value, dict):
+        return sum(payload_size(key) + payload_size(elem)
+                   for key, elem in value.items())
+    return 8
+
+
+class CallContext:
+    """The D-Bus payload of a running client method."""
+
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+
+
+def get_callers():
+    """Get the nearest callers outside this module and dnfdaemon."""
+    callers = []
+    frame = sys._getframe(2)
+    while frame is not None and len(callers) < STACK_DEPTH:
+        code = frame.f_code
+        if not any(skip in code.co_filename for skip in SKIP_FILES):
+            callers.append('%s (%s:%d)' % (
+                code.co_name, os.path.basename(code.co_filename),
+                frame.f_lineno))
+        frame = frame.f_back
+    return ' <- '.join(callers)
+
+
+class MethodStats:
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.latencies = []
+        self.sent = 0  # bytes
+        self.received = 0  # bytes
+        self.callers = {}  # caller stack -> count
+
+    def add(self, duration, sent, received, callers):
+        self.count += 1
+        self.total += duration
+        if len(self.latencies) < MAX_SAMPLES:
+            self.latencies.append(duration)
+        self.sent += sent
+        self.received += received
+        if callers:
+            self.callers[callers] = self.callers.get(callers, 0) + 1
+
+
+class CallTracer:
+    """Collect the statistics of the D-Bus calls."""
+
+    def __init__(self):
+        self.enabled = False
+        self.capture_stack = False
+        self.methods = {}  # method -> MethodStats
+        self._lock = threading.Lock()  # calls are also done from threads
+        self._local = threading.local()
+
+    def enable(self, capture_stack=False):
+        self.enabled = True
+        self.capture_stack = capture_stack
+
+    def record(self, method, duration, sent, received, error=False):
+        callers = get_callers() if self.capture_stack else None
+        with self._lock:
+            stats = self.methods.setdefault(method, MethodStats())
+            stats.add(duration, sent, received, callers)
+            if error:
+                stats.errors += 1
+
+    def instrument(self, backend):
+        """Trace the D-Bus calls of a backend."""
+        for name in CLIENT_METHODS:
+            if hasattr(backend, name):
+                setattr(backend, name,
+                        self._wrap_method(name, getattr(backend, name)))
+        backend.daemon = TracedProxy(self, backend.daemon)
+
+    def _wrap_method(self, name, method):
+        def newFunc(*args, **kwargs):
+            stack = self._context_stack()
+            context = CallContext()
+            stack.append(context)
+            t_start = time.perf_counter()
+            error = True
+            try:
+                result = method(*args, **kwargs)
+                error = False
+                return result
+            finally:
+                stack.remove(context)
+                self.record(name, time.perf_counter() - t_start,
+                            context.sent, context.received, error)
+        newFunc.__name__ = name
+        newFunc.__doc__ = method.__doc__
+        return newFunc
+
+    def _context_stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def client_context(self, caller_file):
+        """Get the context of the client method doing a raw call, None if
+        the call is not made by a client method.
+
+        A client method can run a mainloop while waiting for the reply,
+        so a raw call from another callback can be made while it runs,
+        the caller file tells them apart.
+        """
+        stack = getattr(self._local, 'stack', None)
+        if stack and CLIENT_FILE in caller_file:
+            return stack[-1]
+        return None
+
+    def summary(self):
+        """Get the summary lines, the methods with the most total time
+        first.
+        """
+        lines = ['%-20s %6s %5s %9s %8s %8s %8s %10s' % (
+            'D-Bus method', 'calls', 'errs', 'total(s)', 'p50(ms)',
+            'p90(ms)', 'max(ms)', 'recv(kB)')]
+        with self._lock:
+            items = sorted(self.methods.items(), key=lambda x: -x[1].total)
+            for name, stats in items:
+                values = sorted(stats.latencies)
+                p90 = values[min(int(len(values) * 0.9), len(values) - 1)]
+                lines.append('%-20s %6d %5d %9.2f %8.1f %8.1f %8.1f %10.1f' % (
+                    name, stats.count, stats.errors, stats.total,
+                    values[len(values) // 2] * 1000, p90 * 1000,
+                    values[-1] * 1000, stats.received / 1024.0))
+            for name, stats in items:
+                if not stats.callers:
+                    continue
+                lines.append('%s callers :' % name)
+                callers = sorted(stats.callers.items(), key=lambda x: -x[1])
+                for caller, count in callers[:5]:
+                    lines.append('  %6d  %s' % (count, caller))
+        return lines
+
+    def dump(self):
+        """Log the summary."""
+        if not self.methods:
+            logger.info('No D-Bus calls traced')
+            return
+        for line in self.summary():
+            logger.info(line)
+
+
+class TracedProxy:
+    """Wrap the raw D-Bus proxy calls (self.daemon.Method(...)), the
+    calls from the traced client methods only adds their payload to the
+    client method.
+    """
+
+    def __init__(self, tracer, proxy):
+        self._tracer = tracer
+        self._proxy = proxy
+
+    def __getattr__(self, name):
+        attr = getattr(self._proxy, name)
+        if not name[:1].isupper() or not callable(attr):
+            return attr
+        tracer = self._tracer
+
+        def newFunc(*args, **kwargs):
+            context = tracer.client_context(
+                sys._getframe(1).f_code.co_filename)
+            method = 'raw:' + name
+            sent = payload_size(args[1:])  # skip the signature
+            if context:
+                context.sent += sent
+            t_start = time.perf_counter()
+
+            def done(result, error=False):
+                received = payload_size(result) if result is not None else 0
+                if context:
+                    context.received += received
+                else:
+                    tracer.record(method, time.perf_counter() - t_start,
+                                  sent, received, error)
+
+            if 'result_handler' in kwargs:  # async call, time the reply
+                result_handler = kwargs['result_handler']
+                error_handler = kwargs.get('error_handler')
+
+                def on_result(proxy, result, user_data):
+                    # without an error_handler, the error is the result
+                    if isinstance(result, Exception):
+                        done(None, error=True)
+                    else:
+                        done(result)
+                    result_handler(proxy, result, user_data)
+
+                def on_error(proxy, error, user_data):
+                    done(None, error=True)
+                    error_handler(proxy, error, user_data)
+
+                kwargs['result_handler'] = on_result
+                if error_handler:  # else the caller gets errors as result
+                    kwargs['error_handler'] = on_error
+                return attr(*args, **kwargs)
+            result = None
+            error = True
+            try:
+                result = attr(*args, **kwargs)
+                error = False
+                return result
+            finally:
+                done(result, error)
+        return newFunc
+
+
+TRACER = CallTracer()
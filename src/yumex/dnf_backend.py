@@ -18,19 +18,47 @@
 #    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
 
+import fnmatch
+import json
 import logging
+import os.path
+import threading
+import time
 
-from gi.repository import Gdk
+from gi.repository import Gio, GLib
 
 import dnfdaemon.client
 
 import yumex.backend
+import yumex.dbustrace
 import yumex.misc
+import yumex.telemetry
 import yumex.const as const
 from yumex.misc import ExceptionHandler, TimeFunction, _, ngettext, CONFIG
+from yumex.tracing import TRACER
 
 logger = logging.getLogger('yumex.yum_backend')
 
+PRELOAD_FILTERS = ['installed', 'available']
+PRELOAD_CHUNK = 250         # packages to build per idle call
+PRELOAD_IDLE_TIME = 2.0     # seconds without user activity before preloading
+
+GROUP_PKG_ATTRS = ['summary', 'size', 'action']
+
+# the rpmdb has moved to /usr/lib/sysimage/rpm in newer releases
+RPMDB_PATHS = ['/usr/lib/sysimage/rpm', '/var/lib/rpm']
+DNF_HISTORY_DB = '/var/lib/dnf/history.sqlite'
+# in WAL mode the writes goes to the -wal file, not the db file itself
+DNF_HISTORY_FILES = [DNF_HISTORY_DB, DNF_HISTORY_DB + '-wal']
+# files also changed by readers of the db (fx. when the daemon is relocked)
+RPMDB_READER_FILES = ('.lock', '-shm', '-journal')
+RPMDB_SETTLE_TIME = 3  # seconds without changes, before reacting
+
+# filters updated, when the metadata has been refreshed in the background
+REFRESH_FILTERS = ['installed', 'updates', 'obsoletes', 'available']
+
+GET_REPO_TIMEOUT = 60000  # ms, for the batched GetRepo calls
+
 
 class DnfPackage(yumex.backend.Package):
     """Abstract package object for a package in the package system."""
@@ -127,18 +155,7 @@ class DnfPackage(yumex.backend.Package):
     @property
     def color(self):
         """Package color to show in package view."""
-        color = CONFIG.conf.color_normal
-        if self.action == 'u':
-            color = CONFIG.conf.color_update
-        elif self.action == 'o':
-            color = CONFIG.conf.color_obsolete
-        elif self.action == 'do':
-            color = CONFIG.conf.color_downgrade
-        elif self.action == 'r':
-            color = CONFIG.conf.color_install
-        rgba = Gdk.RGBA()
-        rgba.parse(color)
-        return rgba
+        return yumex.misc.get_action_color(self.action)
 
     @property
     @ExceptionHandler
@@ -167,10 +184,24 @@ class DnfRootBackend(yumex.backend.Backend, dnfdaemon.client.Client):
     def __init__(self, frontend):
         yumex.backend.Backend.__init__(self, frontend, filters=True)
         dnfdaemon.client.Client.__init__(self)
+        if yumex.dbustrace.TRACER.enabled:
+            yumex.dbustrace.TRACER.instrument(self)
         self._gpg_confirm = None
         self.dnl_progress = None
         self._files_to_download = 0
         self._files_downloaded = 0
+        self._dnl_msg = ''
+        self.dnl_meter = yumex.misc.DownloadMeter()
+        self.timer = yumex.telemetry.TransactionTimer()
+        self.estimator = yumex.telemetry.InstallEstimator()
+        self.preloader = PackagePreloader(self)
+        self.watcher = RpmDbWatcher(self)
+        self.refresher = MetadataRefresher(self)
+        # (grp_id, grp_flt) -> GetGroupPackages result
+        self._group_pkgs = {}
+        self._group_pending = set()
+        self._group_generation = 0  # bumped on reload, to drop old results
+        self._repositories = {}  # flt -> get_repositories() result
         if self.running_api_version == const.NEEDED_DAEMON_API:
             logger.debug('dnfdaemon api version (%d)',
                          self.running_api_version)
@@ -183,6 +214,11 @@ class DnfRootBackend(yumex.backend.Backend, dnfdaemon.client.Client):
                                     const.NEEDED_DAEMON_API))
 
     def on_TransactionEvent(self, event, data):
+        # show the pending progress, before the new state
+        self.frontend.progress.flush()
+        self.timer.event(event)
+        if event in ('verify', 'end-run', 'fail'):
+            self.estimator.end_phase()
         if event == 'start-run':
             self.frontend.infobar.show_progress(True)
         elif event == 'download':
@@ -190,6 +226,7 @@ class DnfRootBackend(yumex.backend.Backend, dnfdaemon.client.Client):
         elif event == 'pkg-to-download':
             self._dnl_packages = data
         elif event == 'signature-check':
+            self._download_done()
             # self.frontend.infobar.show_progress(False)
             self.frontend.infobar.set_progress(0.0)
             self.frontend.infobar.info(_('Checking package signatures'))
@@ -209,28 +246,44 @@ class DnfRootBackend(yumex.backend.Backend, dnfdaemon.client.Client):
             #self.frontend.infobar.hide_sublabel()
         # elif event == '':
         elif event == 'fail':
+            self.frontend.progress.cancel()
             self.frontend.infobar.show_progress(False)
         elif event == 'end-run':
+            self.frontend.progress.cancel()
             self.frontend.infobar.show_progress(False)
         else:
             logger.debug('TransactionEvent : %s', event)
 
     def on_RPMProgress(self, package, action, te_current,
                        te_total, ts_current, ts_total):
+        progress = self.frontend.progress
         num = ' ( %i/%i )' % (ts_current, ts_total)
+        left = None
+        if self.estimator.active and action != 'verify':
+            # weighted by the predicted install time of the packages
+            frac, left = self.estimator.update(package, action,
+                                               te_current, te_total)
+            progress.set_progress(frac, label=num)
+        elif ts_current > 0 and ts_current <= ts_total:
+            frac = float(ts_current) / float(ts_total)
+            progress.set_progress(frac, label=num)
+        progress.set_sub(lambda: self._rpm_action_msg(package, action, left))
+
+    @staticmethod
+    def _rpm_action_msg(package, action, left=None):
+        """Format the RPM progress sublabel (when shown)."""
         if ',' in package:  # this is a pkg_id
             name = yumex.misc.pkg_id_to_full_name(package)
         else:  # this is just a pkg name (cleanup)
             name = package
-        logger.debug('on_RPMProgress : [%s]', package)
-        action_msg = const.RPM_ACTIONS.get(action,None)
+        action_msg = const.RPM_ACTIONS.get(action, None)
         if action_msg:
-            self.frontend.infobar.info_sub( action_msg % name)
-        else:
-            logger.info("RPM Progress: Undefinded action {}".format(action))
-        if ts_current > 0 and ts_current <= ts_total:
-            frac = float(ts_current) / float(ts_total)
-            self.frontend.infobar.set_progress(frac, label=num)
+            if left is not None:
+                return _('%s (%s left)') % (
+                    action_msg % name, yumex.misc.format_duration(left))
+            return action_msg % name
+        logger.info("RPM Progress: Undefinded action {}".format(action))
+        return None
 
     def on_GPGImport(self, pkg_id, userid, hexkeyid, keyurl, timestamp):
         values = (pkg_id, userid, hexkeyid, keyurl, timestamp)
@@ -243,8 +296,8 @@ class DnfRootBackend(yumex.backend.Backend, dnfdaemon.client.Client):
         #print('on_DownloadStart : %s' % (repr(values)))
         self._files_to_download = num_files
         self._files_downloaded = 0
-        self.frontend.infobar.set_progress(0.0)
-        self.frontend.infobar.info_sub(
+        self.dnl_meter.start(num_bytes)
+        self._dnl_msg = (
             # Translators: %d will be replaced with the number of files
             # to download; %s will be replaced with the preformatted
             # number of bytes to download + the prefix (k, M, etc.)
@@ -252,32 +305,48 @@ class DnfRootBackend(yumex.backend.Backend, dnfdaemon.client.Client):
             ngettext('Downloading %d file (%sB)...',
                      'Downloading %d files (%sB)...', num_files) %
             (num_files, yumex.misc.format_number(num_bytes)))
+        self.frontend.progress.flush()
+        self.frontend.infobar.set_progress(0.0)
+        self.frontend.infobar.info_sub(self._dnl_msg)
 
     def on_DownloadProgress(self, name, frac, total_frac, total_files):
         """Progress for a single element in the batch."""
         #values =  (name, frac, total_frac, total_files)
         #print('on_DownloadProgress : %s' % (repr(values)))
         num = '( %d/%d )' % (self._files_downloaded, self._files_to_download)
-        self.frontend.infobar.set_progress(total_frac, label=num)
+        self.dnl_meter.update(total_frac)
+        self.frontend.progress.set_progress(total_frac, label=num)
+        self.frontend.progress.set_sub(
+            lambda: '%s %s' % (self._dnl_msg, self.dnl_meter))
 
     def on_DownloadEnd(self, name, status, msg):
         """Download of af single element ended."""
         #values =  (name, status, msg)
         #print('on_DownloadEnd : %s' % (repr(values)))
         if status == -1 or status == 2:  # download OK or already exists
-            logger.debug('Downloaded : %s', name)
-            self._files_downloaded += 1
+            self._files_downloaded += 1  # counted, shown by the progress
         else:
             logger.debug('Download Error : %s - %s', name, msg)
+        if self._files_downloaded == self._files_to_download:
+            self._download_done()
+
+    def _download_done(self):
+        """Log the download rate, when a download batch is done."""
+        if self.dnl_meter.finish():
+            self.timer.add_bytes(self.dnl_meter.received)
+            logger.info('Download : %d files, %s', self._files_downloaded,
+                        self.dnl_meter.summary())
 
     def on_RepoMetaDataProgress(self, name, frac):
         """Repository Metadata Download progress."""
-        values = (name, frac)
-        logger.debug('on_RepoMetaDataProgress (root): %s', repr(values))
         if frac == 0.0:
-            self.frontend.infobar.info_sub(name)
+            logger.debug('on_RepoMetaDataProgress (root): %s', name)
+            if self.refresher.running:  # the package view can hide it
+                self.frontend.infobar.info(
+                    _('Refreshing Repository Metadata'))
+            self.frontend.progress.set_sub(name)
         else:
-            self.frontend.infobar.set_progress(frac)
+            self.frontend.progress.set_progress(frac)
 
     def setup(self):
         """Setup the dnf backend daemon."""
@@ -291,6 +360,65 @@ class DnfRootBackend(yumex.backend.Backend, dnfdaemon.client.Client):
         except dnfdaemon.client.LockedError:
             return False, 'locked-by-other'
 
+    def setup_sync(self):
+        """Setup the dnf backend daemon, using only synchronous D-Bus calls.
+
+        The async calls in dnfdaemon.client runs a mainloop on the default
+        context, so they can't be used outside the gui thread.
+        Used by BackendWarmup.
+        """
+        try:
+            if not self.daemon.Lock(timeout=GLib.MAXINT):
+                return False, 'locked-by-other'
+            self.daemon.SetWatchdogState('(b)', False, timeout=GLib.MAXINT)
+            self._update_config_options(sync=True)
+            return True, ''
+        except GLib.Error as err:
+            res = const.DBUS_ERR_RE.match(str(err))
+            if res and res.groups()[0].endswith('AccessDeniedError'):
+                return False, 'not-authorized'
+            elif res and res.groups()[0].endswith('LockedError'):
+                return False, 'locked-by-other'
+            raise
+
+    def get_packages_sync(self, flt):
+        """Get (pkg_id, summary, size) for a filter with a synchronous
+        D-Bus call (see setup_sync), safe to use from a worker thread.
+        """
+        fields = ['summary', 'size']  # fields to get
+        result = self.daemon.GetPackages('(sas)', flt, fields,
+                                         timeout=GLib.MAXINT)
+        return json.loads(result)
+
+    def get_installed_ids_sync(self):
+        """Get the pkg_ids of the installed packages with a synchronous
+        D-Bus call (see setup_sync), without the package attributes.
+        """
+        result = self.daemon.GetPackages('(sas)', 'installed', [],
+                                         timeout=GLib.MAXINT)
+        return [elem if isinstance(elem, str) else elem[0]
+                for elem in json.loads(result)]
+
+    def get_history_packages_sync(self, tid):
+        """Get the packages in a history transaction with a synchronous
+        D-Bus call (see setup_sync), safe to use from a worker thread.
+        """
+        result = self.daemon.GetHistoryPackages('(i)', tid,
+                                                timeout=GLib.MAXINT)
+        return json.loads(result)
+
+    def prefetch_packages(self, flt):
+        """Load packages for a filter into the cache, using a synchronous
+        D-Bus call (see setup_sync).
+        """
+        if self.cache.is_populated(flt):
+            return
+        po_list = self.get_packages_sync(flt)
+        if flt == 'updates_all':
+            flt = 'updates'
+        pkgs = self._make_pkg_object(po_list, flt)
+        self.cache.populate(flt, pkgs)
+
     @ExceptionHandler
     def quit(self):
         """Quit the dnf backend daemon."""
@@ -300,6 +428,7 @@ class DnfRootBackend(yumex.backend.Backend, dnfdaemon.client.Client):
     @ExceptionHandler
     def reload(self):
         """Reload the dnf backend daemon."""
+        self._clear_caches()
         self.Unlock()  # Release the lock
         # time.sleep(5)
         self.Lock()  # Load & Lock the daemon
@@ -307,22 +436,138 @@ class DnfRootBackend(yumex.backend.Backend, dnfdaemon.client.Client):
         #self._update_config_options()
         self.cache.reset()  # Reset the cache
 
-    def _update_config_options(self):
+    def _clear_caches(self):
+        """Clear the caches depending on the daemon state, except the
+        package cache.
+        """
+        self.preloader.cancel()
+        self.refresher.cancel()
+        self._group_pkgs = {}
+        self._group_pending = set()
+        self._group_generation += 1
+        self._repositories = {}
+
+    def apply_transaction(self, transaction):
+        """Update the package cache with the result of a transaction,
+        instead of reloading all packages.
+
+        Installed packages are marked as installed, removed and replaced
+        packages are removed from the cache. The loaded filters are
+        revalidated against the daemon in the background afterwards,
+        'available' too when packages are removed, they can still be
+        available from a repository.
+
+        :param transaction: transaction result [(sub, [(pkg_id, size,
+                            replaces)])] as from BuildTransaction
+        """
+        self._clear_caches()
+        filters = ['installed', 'updates', 'obsoletes']
+        for sub, pkgs in transaction:
+            for pkg_id, size, replaces in pkgs:
+                fullname = yumex.misc.pkg_id_to_full_name(pkg_id)
+                if sub in ('remove', 'remove-deps'):
+                    self._remove_from_cache(fullname)
+                    if 'available' not in filters:
+                        filters.append('available')
+                else:
+                    self._set_installed_in_cache(pkg_id, size)
+                for replaced_id in replaces:
+                    replaced = yumex.misc.pkg_id_to_full_name(replaced_id)
+                    if replaced != fullname:
+                        self._remove_from_cache(replaced)
+        self.preloader.revalidate(filters)
+
+    def _remove_from_cache(self, fullname):
+        po = self.cache.get_package(fullname)
+        if po:
+            self.cache.remove_package(po)
+
+    def _set_installed_in_cache(self, pkg_id, size):
+        (n, e, v, r, a, repo_id) = self.to_pkg_tuple(pkg_id)
+        if not repo_id.startswith('@'):
+            repo_id = '@' + repo_id
+        inst_id = ','.join([n, e, v, r, a, repo_id])
+        po = self.cache.get_package(yumex.misc.pkg_id_to_full_name(pkg_id))
+        if po:
+            po.queued = None
+            po.selected = False
+            po.downgrade_po = None
+            self.cache.update_package(po, action='r', repository=repo_id,
+                                      pkg_id=inst_id)
+        elif self.cache.is_populated('installed'):
+            # summary is unknown, until the cache has been revalidated
+            self.cache.find_packages([DnfPackage((inst_id, '', size),
+                                                 'r', self)])
+
+    @ExceptionHandler
+    def change_enabled_repos(self, enabled_before, enabled_now):
+        """Change the enabled repositories.
+
+        Only the package cache for the changed repositories is updated
+        (and the updates/obsoletes), instead of reloading everything.
+
+        :param enabled_before: repo ids enabled before the change
+        :param enabled_now: repo ids to enable
+        :return: list of packages removed from the cache
+        """
+        self._clear_caches()
+        disabled = set(enabled_before) - set(enabled_now)
+        enabled = set(enabled_now) - set(enabled_before)
+        logger.debug('repos disabled : %s enabled : %s', disabled, enabled)
+        removed = []
+        for repo_id in disabled:
+            removed.extend(self.cache.drop_repo(repo_id))
+        fields = ['summary', 'size']  # fields to get
+        self.SetEnabledRepos(enabled_now)
+        if enabled and self.cache.is_populated('available'):
+            # add the packages from the new repositories only
+            po_list = [values for values in
+                       self.GetPackages('available', fields)
+                       if self.to_pkg_tuple(values[0])[5] in enabled]
+            self._make_pkg_object(po_list, 'available')
+        for flt in ['updates', 'obsoletes']:
+            if self.cache.is_populated(flt):
+                po_list = self.GetPackages(flt, fields)
+                action = const.FILTER_ACTIONS[flt]
+                pkgs = [DnfPackage(values, action, self)
+                        for values in po_list]
+                added, dropped = self.cache.replace(flt, pkgs)
+                logger.debug('%s : %d added, %d removed',
+                             flt, len(added), len(dropped))
+                removed.extend(dropped)
+        return removed
+
+    def _update_config_options(self, sync=False):
+        """Set the daemon config from the yumex settings.
+
+        :param sync: use synchronous D-Bus calls (see setup_sync)
+        """
+        if sync:
+            def set_config(setting, value):
+                self.daemon.SetConfig('(ss)', setting, json.dumps(value),
+                                      timeout=GLib.MAXINT)
+
+            def set_enabled_repos(repo_ids):
+                self.daemon.SetEnabledRepos('(as)', repo_ids,
+                                            timeout=GLib.MAXINT)
+        else:
+            set_config = self.SetConfig
+            set_enabled_repos = self.SetEnabledRepos
         if CONFIG.session.clean_instonly:
-            self.SetConfig('installonly_limit', CONFIG.conf.installonly_limit)
+            set_config('installonly_limit', CONFIG.conf.installonly_limit)
             logger.debug('installonly_limit = %d',
                          CONFIG.conf.installonly_limit)
         else:
-            self.SetConfig('installonly_limit', "<off>")
+            set_config('installonly_limit', "<off>")
             logger.debug('installonly_limit = %s', "<off>")
-        self.SetConfig('clean_requirements_on_remove',
-                       CONFIG.session.clean_unused)
+        set_config('clean_requirements_on_remove',
+                   CONFIG.session.clean_unused)
         logger.debug('clean_requirements_on_remove = %s',
                      CONFIG.session.clean_unused)
         if CONFIG.session.enabled_repos:
             logger.debug('root: Setting repos : %s',
                          CONFIG.session.enabled_repos)
-            self.SetEnabledRepos(CONFIG.session.enabled_repos)
+            set_enabled_repos(CONFIG.session.enabled_repos)
 
     def to_pkg_tuple(self, pkg_id):
         """Get package nevra & repoid from an package pkg_id"""
@@ -394,14 +639,28 @@ class DnfRootBackend(yumex.backend.Backend, dnfdaemon.client.Client):
             filters = [flt]
         result = []
         for pkg_flt in filters:
+            if self.refresher.running:
+                # the daemon is busy, only use the cache, the view is
+                # updated when the refresh is done (on_metadata_refreshed)
+                if pkg_flt == 'updates_all':
+                    pkg_flt = 'updates'
+                if self.cache.is_populated(pkg_flt):
+                    result.extend(
+                        yumex.backend.Backend.get_packages(self, pkg_flt))
+                else:
+                    logger.debug('get-packages : %s not cached while '
+                                 'refreshing', pkg_flt)
+                continue
             # is this type of packages is already cached ?
             if not self.cache.is_populated(pkg_flt):
                 fields = ['summary', 'size']  # fields to get
-                po_list = self.GetPackages(pkg_flt, fields)
+                with TRACER.span('GetPackages', flt=pkg_flt):
+                    po_list = self.GetPackages(pkg_flt, fields)
                 if pkg_flt == 'updates_all':
                     pkg_flt = 'updates'
-                pkgs = self._make_pkg_object(po_list, pkg_flt)
-                self.cache.populate(pkg_flt, pkgs)
+                with TRACER.span('build-packages', count=len(po_list)):
+                    pkgs = self._make_pkg_object(po_list, pkg_flt)
+                    self.cache.populate(pkg_flt, pkgs)
             result.extend(yumex.backend.Backend.get_packages(self, pkg_flt))
         return result
 
@@ -419,15 +678,65 @@ class DnfRootBackend(yumex.backend.Backend, dnfdaemon.client.Client):
 
     @ExceptionHandler
     def get_repositories(self, flt='*'):
-        """Get a list of repo attributes to populate repo view."""
-        repo_list = []
-        repos = self.GetRepositories(flt)
-        for repo_id in repos:
-            if repo_id.endswith('-source') or repo_id.endswith('-debuginfo'):
-                continue
-            repo = self.GetRepo(repo_id)
-            repo_list.append([repo['enabled'], repo_id, repo['name'], False])
-        return sorted(repo_list, key=lambda elem: elem[1])
+        """Get a list of repo attributes to populate repo view.
+
+        The result is cached until the backend is reloaded.
+        """
+        if flt not in self._repositories:
+            repo_ids = [repo_id for repo_id in self.GetRepositories(flt)
+                        if not repo_id.endswith(('-source', '-debuginfo'))]
+            repos = self._get_repos(repo_ids)
+            repo_list = [[repos[repo_id]['enabled'], repo_id,
+                          repos[repo_id]['name'], False]
+                         for repo_id in repo_ids]
+            self._repositories[flt] = sorted(repo_list,
+                                             key=lambda elem: elem[1])
+        return [list(elem) for elem in self._repositories[flt]]
+
+    def _get_repos(self, repo_ids):
+        """Get the repo attributes for a list of repo ids.
+
+        All the GetRepo calls are send at once, and the replies are
+        collected in a mainloop (like _run_dbus_async does for a single
+        call), instead of waiting for the reply to each call before
+        sending the next one.
+        """
+        if not repo_ids:
+            return {}
+        repos = {}
+        errors = []
+        main_loop = GLib.MainLoop()
+        pending = [len(repo_ids)]
+
+        def done():
+            pending[0] -= 1
+            if pending[0] == 0:
+                main_loop.quit()
+
+        def on_reply(proxy, result, repo_id):
+            try:
+                repos[repo_id] = json.loads(result)
+            except ValueError as e:
+                errors.append(e)
+            finally:
+                done()
+
+        def on_error(proxy, error, repo_id):
+            try:
+                errors.append(error)
+            finally:
+                done()
+
+        # a call without a reply fails with a timeout error, so the
+        # mainloop always ends
+        for repo_id in repo_ids:
+            self.daemon.GetRepo('(s)', repo_id, result_handler=on_reply,
+                                error_handler=on_error, user_data=repo_id,
+                                timeout=GET_REPO_TIMEOUT)
+        main_loop.run()
+        if errors:
+            raise dnfdaemon.client.DaemonError(str(errors[0]))
+        return repos
 
     @TimeFunction
     @ExceptionHandler
@@ -454,6 +763,27 @@ class DnfRootBackend(yumex.backend.Backend, dnfdaemon.client.Client):
                            newest_only, tags)
         return self._make_pkg_object_with_attr(pkgs)
 
+    def search_cache(self, name_key=None, keys=None):
+        """Search the cached packages, used while the daemon is busy
+        refreshing the metadata.
+
+        :param name_key: package name wildcard
+        :param keys: keys to find in name or summary (all must match)
+        """
+        pkgs = []
+        for flt in REFRESH_FILTERS:
+            if self.cache.is_populated(flt):
+                pkgs.extend(yumex.backend.Backend.get_packages(self, flt))
+        if name_key:
+            pkgs = [po for po in pkgs
+                    if fnmatch.fnmatchcase(po.name, name_key)]
+        if keys:
+            keys = [key.lower() for key in keys]
+            pkgs = [po for po in pkgs
+                    if all(key in po.name.lower() or
+                           key in po.summary.lower() for key in keys)]
+        return pkgs
+
     @ExceptionHandler
     def get_groups(self):
         """Get groups/categories from dnf daemon backend"""
@@ -467,6 +797,428 @@ class DnfRootBackend(yumex.backend.Backend, dnfdaemon.client.Client):
         :param grp_id:
         :param grp_flt:
         """
-        attrs = ['summary', 'size', 'action']
-        pkgs = self.GetGroupPackages(grp_id, grp_flt, attrs)
-        return self._make_pkg_object_with_attr(pkgs)
+        key = (grp_id, grp_flt)
+        if key not in self._group_pkgs:
+            self._group_pkgs[key] = self.GetGroupPackages(grp_id, grp_flt,
+                                                          GROUP_PKG_ATTRS)
+        return self._make_pkg_object_with_attr(self._group_pkgs[key])
+
+    def prefetch_group_packages(self, grp_ids, grp_flt='all'):
+        """Load the packages for a list of groups into the group cache,
+        in a worker thread.
+
+        :param grp_ids: list of group ids
+        :param grp_flt:
+        """
+        grp_ids = [grp_id for grp_id in grp_ids
+                   if (grp_id, grp_flt) not in self._group_pkgs and
+                   (grp_id, grp_flt) not in self._group_pending]
+        if not grp_ids:
+            return
+        logger.debug('prefetch group packages : %s', grp_ids)
+        self._group_pending.update((grp_id, grp_flt) for grp_id in grp_ids)
+        thread = threading.Thread(target=self._fetch_group_packages,
+                                  args=(grp_ids, grp_flt,
+                                        self._group_generation))
+        thread.daemon = True
+        thread.start()
+
+    def _fetch_group_packages(self, grp_ids, grp_flt, generation):
+        """Get group packages with sync D-Bus calls (worker thread)."""
+        for grp_id in grp_ids:
+            if generation != self._group_generation:
+                return  # reloaded, the result is not needed any more
+            try:
+                result = self.daemon.GetGroupPackages(
+                    '(ssas)', grp_id, grp_flt, GROUP_PKG_ATTRS,
+                    timeout=GLib.MAXINT)
+                pkgs = json.loads(result)
+            except GLib.Error as e:
+                logger.debug('prefetch of group %s failed : %s', grp_id, e)
+                pkgs = None
+            GLib.idle_add(self._on_group_packages, (grp_id, grp_flt), pkgs,
+                          generation, priority=GLib.PRIORITY_LOW)
+
+    def _on_group_packages(self, key, pkgs, generation):
+        if generation == self._group_generation:
+            self._group_pending.discard(key)
+            if pkgs is not None and key not in self._group_pkgs:
+                self._group_pkgs[key] = pkgs
+        return False
+
+
+class BackendWarmup(threading.Thread):
+    """Start, lock and load the root backend in a worker thread.
+
+    This runs while the main window is build, so starting the daemon,
+    getting the lock and loading the first package lists is not done
+    in serial with the gui setup. The frontend takes over the backend
+    in get_root_backend().
+    """
+
+    def __init__(self, prefetch):
+        threading.Thread.__init__(self, name='backend-warmup')
+        self.daemon = True
+        self.prefetch = prefetch  # filters to load into the cache
+        self.backend = None
+        self.locked = False
+        self.msg = ''
+        self.error = None
+
+    def run(self):
+        try:
+            self.backend = DnfRootBackend(None)
+            self.locked, self.msg = self.backend.setup_sync()
+        except Exception as e:  # raised again in the gui thread
+            self.error = e
+            return
+        if self.locked:
+            try:
+                for flt in self.prefetch:
+                    logger.debug('warmup: prefetch %s', flt)
+                    self.backend.prefetch_packages(flt)
+            except GLib.Error as e:
+                # the gui thread will load the packages again and
+                # handle the error the normal way.
+                logger.debug('warmup: prefetch failed : %s', e)
+
+
+class PackagePreloader:
+    """Load packages into the cache in the background, when idle.
+
+    Used to preload the installed & available packages and to revalidate
+    the loaded filters against the daemon after a transaction.
+
+    The package list is fetched in a worker thread, the package objects
+    are build in the gui thread in small chunks from a low priority idle
+    handler. Work pauses while the frontend is working or the user
+    has been active within the last PRELOAD_IDLE_TIME seconds.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._generation = 0  # bumped on cancel, to drop stale results
+        self._queue = []  # (flt, revalidate)
+        self._current = None  # (flt, po_list, pos)
+        self._source_id = None
+        self._fetching = False
+
+    def start(self):
+        """Start preloading the filters not in the cache yet."""
+        if not CONFIG.conf.preload_packages:
+            return
+        for flt in PRELOAD_FILTERS:
+            if not self.backend.cache.is_populated(flt) and \
+                    (flt, False) not in self._queue:
+                self._queue.append((flt, False))
+        self._wakeup()
+
+    def revalidate(self, filters):
+        """Get the loaded filters again, and update the cache with the
+        differences.
+
+        :param filters: list of package filters
+        """
+        for flt in filters:
+            if self.backend.cache.is_populated(flt) and \
+                    (flt, True) not in self._queue:
+                self._queue.append((flt, True))
+        self._wakeup()
+
+    def cancel(self):
+        """Stop the background loading (the cache is about to be reset)."""
+        self._generation += 1
+        self._queue = []
+        self._current = None
+        self._fetching = False
+        if self._source_id:
+            GLib.source_remove(self._source_id)
+            self._source_id = None
+
+    def _wakeup(self):
+        if self._queue and self._source_id is None and not self._fetching:
+            self._schedule(PRELOAD_IDLE_TIME)
+
+    def _is_busy(self):
+        frontend = self.backend.frontend
+        if frontend is None or frontend.is_working:
+            return True
+        last_activity = getattr(frontend, 'last_activity', 0.0)
+        return time.monotonic() - last_activity < PRELOAD_IDLE_TIME
+
+    def _schedule(self, delay):
+        self._source_id = GLib.timeout_add(
+            int(delay * 1000), self._on_timeout,
+            priority=GLib.PRIORITY_LOW)
+
+    def _on_timeout(self):
+        self._source_id = None
+        if self._is_busy():
+            self._schedule(PRELOAD_IDLE_TIME)
+        elif self._current:  # continue building package objects
+            self._source_id = GLib.idle_add(self._on_idle,
+                                            priority=GLib.PRIORITY_LOW)
+        elif self._queue:
+            flt, revalidate = self._queue.pop(0)
+            if not revalidate and self.backend.cache.is_populated(flt):
+                self._schedule(0)
+                return False
+            logger.debug('preload: fetching %s', flt)
+            self._fetching = True
+            thread = threading.Thread(target=self._fetch,
+                                      args=(flt, revalidate,
+                                            self._generation))
+            thread.daemon = True
+            thread.start()
+        return False
+
+    def _fetch(self, flt, revalidate, generation):
+        """Get the package list (worker thread)."""
+        try:
+            po_list = self.backend.get_packages_sync(flt)
+        except GLib.Error as e:
+            logger.debug('preload: fetching %s failed : %s', flt, e)
+            po_list = None
+        GLib.idle_add(self._on_fetched, flt, revalidate, po_list, generation,
+                      priority=GLib.PRIORITY_LOW)
+
+    @property
+    def fetching(self):
+        """A package list is being fetched from the daemon."""
+        return self._fetching
+
+    def _on_fetched(self, flt, revalidate, po_list, generation):
+        if generation != self._generation:
+            return False  # canceled while fetching
+        self._fetching = False
+        if po_list is not None:
+            if revalidate:
+                self._replace(flt, po_list)
+            else:
+                self._current = (flt, po_list, 0)
+        self._schedule(0)
+        return False
+
+    def _replace(self, flt, po_list):
+        """Update the cache for a filter with the current package list."""
+        action = const.FILTER_ACTIONS[flt]
+        added, removed = self.backend.cache.replace(
+            flt, [DnfPackage(values, action, self.backend)
+                  for values in po_list])
+        logger.debug('revalidate: %s : %d added, %d removed',
+                     flt, len(added), len(removed))
+        frontend = self.backend.frontend
+        if (added or removed) and hasattr(frontend, 'on_cache_changed'):
+            frontend.on_cache_changed(flt)
+
+    def _on_idle(self):
+        """Build the next chunk of package objects."""
+        if self._is_busy():
+            self._source_id = None
+            self._schedule(PRELOAD_IDLE_TIME)
+            return False
+        flt, po_list, pos = self._current
+        cache = self.backend.cache
+        if not cache.is_populated(flt):  # user could have loaded it
+            action = const.FILTER_ACTIONS[flt]
+            chunk = po_list[pos:pos + PRELOAD_CHUNK]
+            cache.find_packages(
+                [DnfPackage(values, action, self.backend)
+                 for values in chunk])
+            pos += PRELOAD_CHUNK
+            if pos < len(po_list):
+                self._current = (flt, po_list, pos)
+                return True
+            cache.set_populated(flt)
+            logger.debug('preload: %s loaded (%d packages)',
+                         flt, len(po_list))
+        self._current = None
+        self._source_id = None
+        self._schedule(0)
+        return False
+
+
+class RpmDbWatcher:
+    """Watch the rpmdb and the dnf history db for changes made outside
+    yumex (dnf in a terminal, the updater etc.).
+
+    A burst of changes (a rpm transaction) is handled as one change, when
+    no changes has been seen for RPMDB_SETTLE_TIME seconds. Then the
+    frontend is told by calling its on_rpmdb_changed() method.
+    While the frontend is working or the packages are being fetched,
+    the change is checked again later. Changes made by yumex itself (see
+    ignore_changes) are dropped, and the lock and shared memory files,
+    there is also changed by readers, are not watched.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._monitors = []
+        self._source_id = None
+        self._ignore_until = 0.0
+
+    def start(self):
+        """Start watching, if not started already."""
+        if self._monitors:
+            return
+        for path in RPMDB_PATHS:
+            if os.path.isdir(path):
+                gfile = Gio.File.new_for_path(path)
+                self._monitors.append(gfile.monitor_directory(
+                    Gio.FileMonitorFlags.NONE, None))
+                break
+        for path in DNF_HISTORY_FILES:
+            gfile = Gio.File.new_for_path(path)
+            self._monitors.append(gfile.monitor_file(
+                Gio.FileMonitorFlags.NONE, None))
+        for monitor in self._monitors:
+            monitor.connect('changed', self._on_changed)
+
+    def stop(self):
+        """Stop watching."""
+        for monitor in self._monitors:
+            monitor.cancel()
+        self._monitors = []
+        self._cancel_pending()
+
+    def ignore_changes(self):
+        """Ignore the current changes (made by our own transaction or
+        relock) and changes for the next RPMDB_SETTLE_TIME seconds.
+        """
+        self._cancel_pending()
+        self._ignore_until = time.monotonic() + RPMDB_SETTLE_TIME
+
+    def _cancel_pending(self):
+        if self._source_id:
+            GLib.source_remove(self._source_id)
+            self._source_id = None
+
+    def _is_busy(self):
+        backend = self.backend
+        return backend.frontend.is_working or backend.preloader.fetching or \
+            backend.refresher.running
+
+    def _on_changed(self, monitor, gfile, other_file, event):
+        if event == Gio.FileMonitorEvent.ATTRIBUTE_CHANGED or \
+                gfile.get_basename().endswith(RPMDB_READER_FILES) or \
+                self.backend.frontend is None or \
+                time.monotonic() < self._ignore_until:
+            return
+        # wait for the writes to settle down
+        self._cancel_pending()
+        self._source_id = GLib.timeout_add_seconds(RPMDB_SETTLE_TIME,
+                                                   self._on_settled)
+
+    def _on_settled(self):
+        self._source_id = None
+        if self._is_busy():
+            # check again, when yumex is done (a transaction made by
+            # yumex cancels it, see ignore_changes)
+            self._source_id = GLib.timeout_add_seconds(RPMDB_SETTLE_TIME,
+                                                       self._on_settled)
+            return False
+        logger.debug('rpmdb changed outside yumex')
+        self.backend.frontend.on_rpmdb_changed()
+        return False
+
+
+class MetadataRefresher:
+    """Refresh the repository metadata without blocking the gui.
+
+    ExpireCache is called async, so the cached package lists can still be
+    browsed and searched (see search_cache) while the metadata is
+    downloaded. When done, the loaded package lists are fetched again in a
+    worker thread and swapped into the cache at once in the gui thread.
+    The frontend is told by calling its on_metadata_refreshed() method.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.running = False
+        self._generation = 0  # bumped on cancel, to drop stale results
+
+    def start(self):
+        """Start the refresh, if it is not running already."""
+        if self.running:
+            return
+        logger.debug('refresh: expire cache')
+        self.running = True
+        self.backend.preloader.cancel()  # the daemon is busy anyway
+        self.backend.daemon.ExpireCache(
+            '()', result_handler=self._on_expired,
+            error_handler=self._on_error, user_data=self._generation,
+            timeout=GLib.MAXINT)
+
+    def cancel(self):
+        """Drop the result of a running refresh."""
+        self._generation += 1
+        self.running = False
+
+    def _on_error(self, proxy, error, generation):
+        if generation != self._generation:
+            return
+        logger.debug('refresh: expire cache failed : %s', error)
+        self._done(False)
+
+    def _on_expired(self, proxy, result, generation):
+        if generation != self._generation:
+            return
+        if not result:
+            self._done(False)
+            return
+        filters = [flt for flt in REFRESH_FILTERS
+                   if self.backend.cache.is_populated(flt)]
+        if 'updates' in filters and not CONFIG.session.newest_only:
+            filters[filters.index('updates')] = 'updates_all'
+        thread = threading.Thread(target=self._fetch,
+                                  args=(filters, generation))
+        thread.daemon = True
+        thread.start()
+
+    def _fetch(self, filters, generation):
+        """Get the package lists from the new metadata (worker thread)."""
+        try:
+            lists = [(flt, self.backend.get_packages_sync(flt))
+                     for flt in filters]
+        except GLib.Error as e:
+            logger.debug('refresh: fetching packages failed : %s', e)
+            lists = None
+        GLib.idle_add(self._on_fetched, lists, generation,
+                      priority=GLib.PRIORITY_LOW)
+
+    def _on_fetched(self, lists, generation):
+        if generation != self._generation:
+            return False
+        backend = self.backend
+        if lists is None:
+            # the metadata is refreshed, but the cached packages is not,
+            # keep showing them and update them in the background
+            self._done(True, None)
+            backend.preloader.revalidate(REFRESH_FILTERS)
+            return False
+        new_updates = 0
+        removed = []
+        for flt, po_list in lists:
+            if flt == 'updates_all':
+                flt = 'updates'
+            action = const.FILTER_ACTIONS[flt]
+            added, dropped = backend.cache.replace(
+                flt, [DnfPackage(values, action, backend)
+                      for values in po_list])
+            logger.debug('refresh: %s : %d added, %d removed',
+                         flt, len(added), len(dropped))
+            if flt in ('updates', 'obsoletes'):
+                new_updates += len(added)
+            removed.extend(dropped)
+        self._done(True, new_updates, removed)
+        return False
+
+    def _done(self, success, new_updates=0, removed=None):
+        """The refresh is done, new_updates is None if the packages
+        are not fetched yet.
+        """
+        self.running = False
+        if success:
+            self.backend._clear_caches()  # groups & repos can have changed
+        self.backend.frontend.on_metadata_refreshed(success, new_updates,
+                                                    removed or [])
@@ -65,16 +65,18 @@ class Preferences:
         widget = self.base.ui.get_object('repo_sw')
         widget.add(self.repo_view)
         self.repos = []
+        self.colors_changed = False
+        self.repo_change = None  # (enabled before, enabled now)
 
     def run(self):
+        self.colors_changed = False
+        self.repo_change = None
         self.get_settings()
         self.dialog.show_all()
         rc = self.dialog.run()
         self.dialog.hide()
-        need_reset = False
         if rc == 1:
-            need_reset = self.set_settings()
-        return need_reset
+            self.set_settings()
 
     def get_settings(self):
         # set boolean states
@@ -118,7 +120,6 @@ class Preferences:
 
     def set_settings(self):
         changed = False
-        need_reset = False
         # handle boolean options
         for option in Preferences.FLAGS:
             widget = self.base.ui.get_object('pref_' + option)
@@ -135,6 +136,9 @@ class Preferences:
             if color != getattr(CONFIG.conf, name):  # changed ??
                 setattr(CONFIG.conf, name, color)
                 changed = True
+                self.colors_changed = True
+        if self.colors_changed:
+            yumex.misc.update_action_colors()
         # handle value options
         for name in Preferences.VALUES:
             widget = self.base.ui.get_object('pref_' + name)
@@ -147,15 +151,17 @@ class Preferences:
         repo_now = self.repo_view.get_selected()
         # repo selection changed
         if repo_now != repo_before:
+            # an empty selection means the default enabled repos
+            enabled_before = repo_before or [repo[1] for repo in self.repos
+                                             if repo[0]]
             CONFIG.session.enabled_repos = repo_now     # set the new selection
-            # we need to reset the gui
-            need_reset = True
+            # the gui will update the packages for the changed repos
+            self.repo_change = (enabled_before, repo_now)
             if CONFIG.conf.repo_saved:
                 CONFIG.conf.repo_enabled = repo_now
                 changed = True
         if changed:
             CONFIG.write()
-        return need_reset
 
     def handle_setting(self, option, state):
         if option == 'autostart':
@@ -18,12 +18,16 @@
 #    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
 
+import collections
+import itertools
 import os
 import logging
+import threading
 
 from gi.repository import Gtk
 from gi.repository import Gdk
 from gi.repository import GdkPixbuf
+from gi.repository import GLib
 from gi.repository import GObject
 
 from yumex import const
@@ -32,6 +36,8 @@ import yumex.misc as misc
 
 logger = logging.getLogger('yumex.gui.views')
 
+HISTORY_CACHE_SIZE = 50  # transactions with grouped packages to keep
+
 
 class SelectionView(Gtk.TreeView):
     '''
@@ -67,15 +73,24 @@ class SelectionView(Gtk.TreeView):
         return column
 
     def create_text_column(self, hdr, prop, size, sortcol=None,
-                           click_handler=None, tooltip=None):
+                           click_handler=None, tooltip=None, fgcolor=None):
         """
         Create a TreeViewColumn with text and set
         the sorting properties and add it to the view
+
+        prop is an object attribute (get by a cell data function) or
+        a model column number, fgcolor is an optional model column with
+        the foreground color (Gdk.RGBA), used with a column number.
         """
         cell = Gtk.CellRendererText()  # Size Column
         column = Gtk.TreeViewColumn(hdr, cell)
         column.set_resizable(True)
-        column.set_cell_data_func(cell, self.get_data_text, prop)
+        if isinstance(prop, int):
+            column.add_attribute(cell, 'text', prop)
+            if fgcolor is not None:
+                column.add_attribute(cell, 'foreground-rgba', fgcolor)
+        else:
+            column.set_cell_data_func(cell, self.get_data_text, prop)
         column.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
         column.set_fixed_width(size)
         if sortcol:
@@ -105,13 +120,16 @@ class SelectionView(Gtk.TreeView):
         '''Create an selection column, there get data via property function
         and a key attr
 
-        @param attr: key attr for property funtion
+        @param attr: key attr for property funtion or a model column number
         '''
         # Setup a selection column using a object attribute
         cell1 = Gtk.CellRendererToggle()  # Selection
         cell1.set_property('activatable', True)
         column1 = Gtk.TreeViewColumn("", cell1)
-        column1.set_cell_data_func(cell1, self.get_data_bool, attr)
+        if isinstance(attr, int):
+            column1.add_attribute(cell1, 'active', attr)
+        else:
+            column1.set_cell_data_func(cell1, self.get_data_bool, attr)
         column1.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
         column1.set_sort_column_id(-1)
         self.append_column(column1)
@@ -217,9 +235,23 @@ class SelectionView(Gtk.TreeView):
 class PackageView(SelectionView):
     __gsignals__ = {'pkg-changed': (GObject.SignalFlags.RUN_FIRST,
                                     None,
-                                    (GObject.TYPE_PYOBJECT,))
+                                    (GObject.TYPE_PYOBJECT,)),
+                    # queue/selection state of packages changed by the view
+                    'pkgs-changed': (GObject.SignalFlags.RUN_FIRST,
+                                     None,
+                                     (GObject.TYPE_PYOBJECT,))
                     }
 
+    # model columns, the display values are stored in the model, so
+    # the view is rendered without calling python cell data functions.
+    (COL_OBJ, COL_KEY, COL_NAME, COL_VER, COL_ARCH, COL_SUMMARY, COL_REPO,
+     COL_SIZE, COL_COLOR, COL_SELECTED, COL_ICON, COL_ICON_VISIBLE) = range(12)
+    STATE_COLUMNS = [COL_SELECTED, COL_ICON, COL_ICON_VISIBLE]
+    # integer sort keys (rank in the sorted values), so sorting the rows is
+    # a native integer compare, (size uses the size in bytes)
+    (SORT_NAME, SORT_VER, SORT_ARCH, SORT_SUMMARY, SORT_REPO,
+     SORT_SIZE) = range(12, 18)
+
     def __init__(self, qview, group_mode=False):
         self.logger = logging.getLogger('yumex.PackageView')
         SelectionView.__init__(self)
@@ -228,6 +260,7 @@ class PackageView(SelectionView):
         self._click_header_state = ""
         self.queue = qview.queue
         self.queueView = qview
+        self._iters = {}  # package -> row iter
         self.store = self._setup_model()
         self.connect('cursor-changed', self.on_cursor_changed)
         self.connect('button-press-event', self.on_mouse_button)
@@ -244,39 +277,51 @@ class PackageView(SelectionView):
         '''
         Setup the model and view
         '''
-        store = Gtk.ListStore(GObject.TYPE_PYOBJECT, str)
+        store = Gtk.ListStore(GObject.TYPE_PYOBJECT, str, str, str, str, str,
+                              str, str, Gdk.RGBA, bool, str, bool,
+                              int, int, int, int, int, GObject.TYPE_INT64)
         self.set_model(store)
         if self.group_mode:
             self.create_selection_colunm(
-                'selected',
+                self.COL_SELECTED,
                 click_handler=self.on_section_header_clicked_group,
                 popup_handler=self.on_section_header_button,
                 tooltip=_("Click to install all/remove all"))
         else:
             self.create_selection_colunm(
-                'selected',
+                self.COL_SELECTED,
                 click_handler=self.on_section_header_clicked,
                 popup_handler=self.on_section_header_button,
                 tooltip=_("Click to select/deselect all"))
         # Setup resent column
         cell2 = Gtk.CellRendererPixbuf()  # new
-        cell2.set_property('icon-name', 'list-add-symbolic')
-        column2 = Gtk.TreeViewColumn("", cell2)
-        column2.set_cell_data_func(cell2, self.new_pixbuf)
+        column2 = Gtk.TreeViewColumn("", cell2, icon_name=self.COL_ICON,
+                                     visible=self.COL_ICON_VISIBLE)
         column2.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
         column2.set_fixed_width(20)
         column2.set_sort_column_id(-1)
         self.append_column(column2)
         column2.set_clickable(True)
 
-        self.create_text_column(_("Package"), 'name', size=200)
-
-        self.create_text_column(_("Ver."), 'fullver', size=120)
-        self.create_text_column(_("Arch."), 'arch', size=60)
-        self.create_text_column(_("Summary"), 'summary', size=400)
-        self.create_text_column(_("Repo."), 'repository', size=90)
-        self.create_text_column(_("Size"), 'sizeM', size=90)
-        self.set_search_column(1)
+        self.create_text_column(_("Package"), self.COL_NAME, size=200,
+                                sortcol=self.SORT_NAME,
+                                fgcolor=self.COL_COLOR)
+        self.create_text_column(_("Ver."), self.COL_VER, size=120,
+                                sortcol=self.SORT_VER,
+                                fgcolor=self.COL_COLOR)
+        self.create_text_column(_("Arch."), self.COL_ARCH, size=60,
+                                sortcol=self.SORT_ARCH,
+                                fgcolor=self.COL_COLOR)
+        self.create_text_column(_("Summary"), self.COL_SUMMARY, size=400,
+                                sortcol=self.SORT_SUMMARY,
+                                fgcolor=self.COL_COLOR)
+        self.create_text_column(_("Repo."), self.COL_REPO, size=90,
+                                sortcol=self.SORT_REPO,
+                                fgcolor=self.COL_COLOR)
+        self.create_text_column(_("Size"), self.COL_SIZE, size=90,
+                                sortcol=self.SORT_SIZE,
+                                fgcolor=self.COL_COLOR)
+        self.set_search_column(self.COL_KEY)
         self.set_enable_search(True)
         # store.set_sort_column_id(1, Gtk.Gtk.SortType.ASCENDING)
         self.set_reorderable(False)
@@ -352,7 +397,7 @@ class PackageView(SelectionView):
         pkg.selected = True
         self.queue.add(pkg, 'ri')
         self.queueView.refresh()
-        self.queue_draw()
+        self._packages_changed([pkg])
 
     def on_package_downgrade(self, widget, event, pkg, do_pkg):
         """Downgrade package right click menu handler"""
@@ -367,7 +412,7 @@ class PackageView(SelectionView):
             do_pkg.downgrade_po = pkg
             self.queue.add(do_pkg, 'do')
             self.queueView.refresh()
-            self.queue_draw()
+            self._packages_changed([pkg, do_pkg])
 
     def on_section_header_clicked(self, widget):
         """  Selection column header clicked"""
@@ -416,29 +461,34 @@ class PackageView(SelectionView):
         '''
         Select all packages in the view
         '''
+        changed = []
         for el in self.store:
             obj = el[0]
             if not obj.queued == obj.action:
                 obj.queued = obj.action
                 self.queue.add(obj)
                 obj.set_select(not obj.selected)
+                changed.append(obj)
         self.queueView.refresh()
-        self.queue_draw()
+        self._packages_changed(changed)
 
     def deselect_all(self):
         '''
         Deselect all packages in the view
         '''
+        changed = []
         for el in self.store:
             obj = el[0]
             if obj.queued == obj.action:
                 obj.queued = None
                 self.queue.remove(obj)
                 obj.set_select(not obj.selected)
+                changed.append(obj)
         self.queueView.refresh()
-        self.queue_draw()
+        self._packages_changed(changed)
 
     def select_by_keys(self, keys):
+        changed = []
         iterator = self.store.get_iter_first()
         while iterator is not None:
             obj = self.store.get_value(iterator, 0)
@@ -446,13 +496,15 @@ class PackageView(SelectionView):
                 obj.queued = obj.action
                 self.queue.add(obj)
                 obj.set_select(True)
+                changed.append(obj)
             elif obj.selected:
                 obj.queued = None
                 self.queue.remove(obj)
                 obj.set_select(False)
+                changed.append(obj)
             iterator = self.store.iter_next(iterator)
         self.queueView.refresh()
-        self.queue_draw()
+        self._packages_changed(changed)
 
     def get_selected(self):
         selected = []
@@ -470,55 +522,124 @@ class PackageView(SelectionView):
                 notselected.append(obj)
         return notselected
 
-    def new_pixbuf(self, column, cell, model, iterator, data):
+    @staticmethod
+    def _get_state(pkg):
+        """Get the values for the STATE_COLUMNS (selected, icon-name and
+        icon visible) of a package.
         """
-        Cell Data function for recent Column, shows pixmap
-        if recent Value is True.
-        """
-        pkg = model.get_value(iterator, 0)
-        if pkg:
-            action = pkg.queued
-            if action:
-                if action in ('u', 'i', 'o'):
-                    icon = 'emblem-downloads'
-                elif action == 'ri':
-                    icon = 'gtk-refresh'
-                elif action == 'do':
-                    icon = 'gtk-go-down'
-                else:
-                    icon = 'edit-delete'
-                cell.set_property('visible', True)
-                cell.set_property('icon-name', icon)
+        action = pkg.queued
+        if action:
+            if action in ('u', 'i', 'o'):
+                icon = 'emblem-downloads'
+            elif action == 'ri':
+                icon = 'gtk-refresh'
+            elif action == 'do':
+                icon = 'gtk-go-down'
             else:
-                cell.set_property('visible', pkg.recent)
-                cell.set_property('icon-name', 'document-new')
+                icon = 'edit-delete'
+            return [pkg.selected, icon, True]
         else:
-            cell.set_property('visible', False)
+            return [pkg.selected, 'document-new', pkg.recent]
+
+    @staticmethod
+    def _get_ranks(values):
+        """Map values to their position in the sorted unique values."""
+        return {value: rank for rank, value in enumerate(sorted(set(values)))}
+
+    def _get_rows(self, pkgs):
+        """Get the model rows for a list of packages (sorted by name)."""
+        evr_keys = {}
+        for po in pkgs:
+            evr = (po.epoch, po.ver, po.rel)
+            if evr not in evr_keys:
+                evr_keys[evr] = misc.evr_key(*evr)
+        evr_ranks = self._get_ranks(evr_keys.values())
+        arch_ranks = self._get_ranks(po.arch for po in pkgs)
+        summary_ranks = self._get_ranks(po.summary or '' for po in pkgs)
+        repo_ranks = self._get_ranks(po.repository for po in pkgs)
+        for name_rank, po in enumerate(sorted(pkgs, key=lambda po: po.name)):
+            evr_rank = evr_ranks[evr_keys[(po.epoch, po.ver, po.rel)]]
+            yield po, [po, str(po), po.name, po.fullver, po.arch, po.summary,
+                       po.repository, po.sizeM, po.color] + \
+                self._get_state(po) + \
+                [name_rank, evr_rank, arch_ranks[po.arch],
+                 summary_ranks[po.summary or ''], repo_ranks[po.repository],
+                 po.size]
+
+    def refresh_packages(self, pkgs):
+        """Update the rows for packages with changed queue/selection state
+        or action.
+
+        Packages not shown in the view are ignored.
+        """
+        for pkg in pkgs:
+            iterator = self._iters.get(pkg)
+            if iterator is not None:
+                self.store.set(iterator,
+                               [self.COL_COLOR] + self.STATE_COLUMNS,
+                               [pkg.color] + self._get_state(pkg))
+
+    def _packages_changed(self, pkgs):
+        """The view has changed the state of packages, update the rows and
+        tell the other views, there can show the same packages.
+        """
+        pkgs = [pkg for pkg in pkgs if pkg is not None]
+        self.refresh_packages(pkgs)
+        if pkgs:
+            self.emit('pkgs-changed', pkgs)
+
+    def refresh_colors(self):
+        """Update the package colors, after the color settings is changed."""
+        for row in self.store:
+            row[self.COL_COLOR] = row[self.COL_OBJ].color
 
     @TimeFunction
     def populate(self, pkgs):
         self.freeze_child_notify()
         self.set_model(None)
+        # keep the current sort order, but don't sort while adding rows
+        sort_col, sort_order = self.store.get_sort_column_id()
+        self.store.set_sort_column_id(
+            Gtk.TREE_SORTABLE_UNSORTED_SORT_COLUMN_ID, Gtk.SortType.ASCENDING)
         self.store.clear()
-        self.set_model(self.store)
+        self._iters = {}
         if pkgs:
             i = 0
-            for po in sorted(pkgs, key=lambda po: po.name):
+            for po, row in self._get_rows(pkgs):
                 i += 1
-                if i % 500:  # Handle Gtk event, so gui dont freeze
+                if i % 500 == 0:  # Handle Gtk event, so gui dont freeze
                     doGtkEvents()
-                self.store.append([po, str(po)])
+                self._iters[po] = self.store.append(row)
+        if sort_col is not None and sort_col >= 0:
+            self.store.set_sort_column_id(sort_col, sort_order)
+        self.set_model(self.store)
         self.thaw_child_notify()
         # reset the selection column header selection state
         self.state = 'normal'
         self._last_selected = []
 
+    def repopulate(self, pkgs):
+        """Show a changed package list, keeping the sort order, the
+        cursor and the scroll position.
+        """
+        vadj = self.get_vadjustment()
+        scroll_pos = vadj.get_value()
+        path, column = self.get_cursor()
+        cursor_po = self.store[path][self.COL_OBJ] if path else None
+        self.populate(pkgs)
+        iterator = self._iters.get(cursor_po)
+        if iterator is not None:
+            self.set_cursor(self.store.get_path(iterator), None, False)
+        # the rows are first measured in the next layout run
+        GLib.idle_add(vadj.set_value, scroll_pos)
+
     def on_toggled(self, widget, path):
         """ Package selection handler """
         iterator = self.store.get_iter(path)
         obj = self.store.get_value(iterator, 0)
         self.togglePackage(obj)
         self.queueView.refresh()
+        self._packages_changed([obj, obj.downgrade_po])
 
     def togglePackage(self, obj):
         '''
@@ -565,34 +686,36 @@ class PackageView(SelectionView):
                 obj.selected = True
                 obj.downgrade_po = pkg
                 self.queue.add(obj, 'do')
-        self.queueView.refresh()
-        self.queue_draw()
 
     def install_all(self):
         '''
         Select all packages in the view
         '''
+        changed = []
         for el in self.store:
             obj = el[0]
             if not obj.queued == obj.action and obj.action == 'i':
                 obj.queued = obj.action
                 self.queue.add(obj)
                 obj.set_select(not obj.selected)
+                changed.append(obj)
         self.queueView.refresh()
-        self.queue_draw()
+        self._packages_changed(changed)
 
     def remove_all(self):
         '''
         Select all packages in the view
         '''
+        changed = []
         for el in self.store:
             obj = el[0]
             if not obj.queued == obj.action and obj.action == 'r':
                 obj.queued = obj.action
                 self.queue.add(obj)
                 obj.set_select(not obj.selected)
+                changed.append(obj)
         self.queueView.refresh()
-        self.queue_draw()
+        self._packages_changed(changed)
 
 
 class PackageQueue:
@@ -723,7 +846,11 @@ class PackageQueue:
 class QueueView(Gtk.TreeView):
     __gsignals__ = {'queue-refresh': (GObject.SignalFlags.RUN_FIRST,
                                       None,
-                                      (GObject.TYPE_INT,))}
+                                      (GObject.TYPE_INT,)),
+                    # packages removed from the queue by the user
+                    'pkgs-removed': (GObject.SignalFlags.RUN_FIRST,
+                                     None,
+                                     (GObject.TYPE_PYOBJECT,))}
 
     def __init__(self, queue_menu):
         Gtk.TreeView.__init__(self)
@@ -762,16 +889,20 @@ class QueueView(Gtk.TreeView):
             row = model[path]
             if row.parent is not None:
                 rmvlist.append(row[0])
+        removed = []
         for pkg in self.filter_pkgs_from_list(rmvlist):
             self.queue.remove(pkg)
             if pkg.queued == "do" and pkg.installed:
                 pkg.downgrade_po.queued = None
                 pkg.downgrade_po.set_select(not pkg.selected)
                 pkg.action = "r"  # reset action type of installed package
+                removed.append(pkg.downgrade_po)
             pkg.queued = None
             pkg.set_select(not pkg.selected)
+            removed.append(pkg)
         self.queue.remove_groups(rmvlist)
         self.refresh()
+        self.emit('pkgs-removed', removed)
 
     def on_QueueView_button_press_event(self, treeview, event):
         '''
@@ -870,7 +1001,19 @@ class HistoryView(Gtk.TreeView):
         self.base = base
         self.pkg_view = HistoryPackageView(self.base)
         self.connect('cursor-changed', self.on_cursor_changed)
+        self.connect('row-expanded', self.on_row_expanded)
         self.is_populated = False
+        # (year, month) -> [(tid, dt), ...] for months not added yet
+        self._pending = {}
+        self._tids = set()
+        # tid -> grouped packages (see group_history_packages), LRU order
+        self._pkg_cache = collections.OrderedDict()
+        self._prefetching = set()
+        self._generation = 0  # bumped on reset, to drop old prefetches
+        self._installed = None  # nevra of the installed packages
+        self._installed_loading = False
+        self._search_key = ''
+        self._indexing = False
 
     def setup_view(self):
         """ Create Notebook list for single page  """
@@ -887,38 +1030,140 @@ class HistoryView(Gtk.TreeView):
     def reset(self):
         self.model.clear()
         self.is_populated = False
+        self._pending = {}
+        self._tids = set()
+        self._pkg_cache.clear()
+        self._prefetching = set()
+        self._generation += 1
+        self._installed = None
+        self._installed_loading = False
+        self._indexing = False
         self.pkg_view.reset()
 
     def populate(self, data):
+        """Populate the year/month nodes, the days & transactions in a
+        month is added, when the month is expanded.
+        """
         self.pkg_view.reset()
         self.model.clear()
-        main = {}
+        self._pending = {}
+        self._tids = set()
         for tid, dt in data:
-            da, t = dt.split('T')
-            y, m, d = da.split('-')
-            # year
-            if y not in main:
-                ycat = self.model.append(None, [y, -1])
-                main[y] = (ycat, {})
-            ycat, mdict = main[y]
-            # month
-            if m not in mdict:
-                mcat = self.model.append(ycat, [m, -1])
-                mdict[m] = (mcat, {})
-            mcat, ddict = mdict[m]
-            # day
-            if d not in ddict:
-                dcat = self.model.append(mcat, [d, -1])
-                ddict[d] = dcat
-            dcat = ddict[d]
-            self.model.append(dcat, [t, tid])
+            self._tids.add(tid)
+            y, m = dt[:7].split('-')
+            self._pending.setdefault((y, m), []).append((tid, dt))
+        years = {}
+        months = {}
+        for y, m in sorted(self._pending):
+            if y not in years:
+                years[y] = self.model.append(None, [y, -1])
+            mcat = self.model.append(years[y], [m, -1])
+            self.model.append(mcat, ['', -1])  # placeholder for expander
+            months[(y, m)] = mcat
+        # the most recent month is shown by default
+        if months:
+            recent = max(months)
+            self._add_month(months[recent], recent)
         self.collapse_all()
+        self._start_indexing()
         path = Gtk.TreePath.new_from_string("0:0:0:0")
         self.expand_to_path(path)
         self.get_selection().select_path(path)
         self.on_cursor_changed(self)
         self.is_populated = True
 
+    def _add_month(self, mcat, key):
+        """Add the days & transactions in a month."""
+        ddict = {}
+        for tid, dt in self._pending.pop(key):
+            da, t = dt.split('T')
+            d = da.split('-')[2]
+            if d not in ddict:
+                ddict[d] = self.model.append(mcat, [d, -1])
+            self.model.append(ddict[d], [t, tid])
+        # remove the placeholder, after the days are added, so an
+        # expanded month stays expanded
+        child = self.model.iter_children(mcat)
+        while child is not None:
+            if self.model.get_value(child, 0) == '':
+                self.model.remove(child)
+                break
+            child = self.model.iter_next(child)
+
+    def on_row_expanded(self, widget, iterator, path):
+        """Add the transactions, when a month is expanded."""
+        if path.get_depth() != 2 or not self._pending:
+            return
+        parent = self.model.iter_parent(iterator)
+        key = (self.model.get_value(parent, 0),
+               self.model.get_value(iterator, 0))
+        if key in self._pending:
+            self._add_month(iterator, key)
+
+    def search(self, key):
+        """Show the transactions with a package (name or name.arch),
+        the selected transaction is shown again, if key is empty.
+
+        The transactions with the packages not in the history mirror yet
+        can't be found, until they are fetched by _start_indexing().
+        """
+        self._search_key = key
+        if key:
+            mirror = self.base.history_mirror
+            installed = self._get_installed() or frozenset()
+            result = []
+            for tid, entries in itertools.groupby(
+                    mirror.index.lookup(key), key=lambda elem: elem[0]):
+                if tid not in self._tids:
+                    continue
+                pkgs = [(pkg_id, state) for tid, pkg_id, state in entries]
+                result.append((mirror.get_date(tid), group_history_packages(
+                    mark_installed(pkgs, installed))))
+            missing = len(mirror.get_missing(self._tids))
+            self.pkg_view.populate_search(key, result, missing)
+        else:
+            self.on_cursor_changed(self)
+
+    def _start_indexing(self):
+        """Get the packages not in the history mirror in a worker thread,
+        so all transactions can be found by search().
+
+        The mirror is stored, so this is only done once for a transaction.
+        """
+        missing = self.base.history_mirror.get_missing(
+            sorted(self._tids, reverse=True))
+        if not missing or self._indexing:
+            return
+        self._indexing = True
+        backend = self.base.get_root_backend()
+        thread = threading.Thread(target=self._fetch_missing,
+                                  args=(backend, missing, self._generation))
+        thread.daemon = True
+        thread.start()
+
+    def _fetch_missing(self, backend, tids, generation):
+        """Get the packages for the transactions (worker thread)."""
+        for tid in tids:
+            if generation != self._generation:
+                return
+            try:
+                pkgs = backend.get_history_packages_sync(tid)
+            except GLib.Error as e:
+                logger.debug('history: fetching %d failed : %s', tid, e)
+                continue
+            GLib.idle_add(self._on_fetched, tid, pkgs, None, generation,
+                          priority=GLib.PRIORITY_LOW)
+        GLib.idle_add(self._on_indexed, generation,
+                      priority=GLib.PRIORITY_LOW)
+
+    def _on_indexed(self, generation):
+        if generation == self._generation:
+            self._indexing = False
+            logger.debug('history: all transactions indexed')
+            if self._search_key:
+                self.search(self._search_key)
+        return False
+
     def on_cursor_changed(self, widget):
         '''
         a new History element is selected in history view
@@ -928,8 +1173,127 @@ class HistoryView(Gtk.TreeView):
             if model is not None and iterator is not None:
                 tid = model.get_value(iterator, 1)
                 if tid != -1:
-                    pkgs = self.base.get_root_backend().GetHistoryPackages(tid)
-                    self.pkg_view.populate(pkgs)
+                    self.pkg_view.populate(self._get_packages(tid))
+                    self._prefetch([tid - 1, tid + 1])
+
+    def _get_installed(self):
+        """Get the nevra of the installed packages, to mark the
+        history packages there is still installed.
+
+        They are taken from the package cache, if the installed packages
+        is loaded. Else only the pkg_ids are fetched in a worker thread
+        and None is returned until they are ready.
+        """
+        if self._installed is None:
+            backend = self.base.get_root_backend()
+            if backend.cache.is_populated('installed'):
+                # not filtered by arch, all installed packages counts
+                self._installed = frozenset(
+                    po.pkg_id.rsplit(',', 1)[0]
+                    for po in backend.cache.installed)
+            elif not self._installed_loading:
+                self._installed_loading = True
+                thread = threading.Thread(target=self._fetch_installed,
+                                          args=(backend, self._generation))
+                thread.daemon = True
+                thread.start()
+        return self._installed
+
+    def _fetch_installed(self, backend, generation):
+        """Get the installed nevra (worker thread)."""
+        try:
+            installed = frozenset(pkg_id.rsplit(',', 1)[0] for pkg_id
+                                  in backend.get_installed_ids_sync())
+        except GLib.Error as e:
+            logger.debug('history: fetching installed failed : %s', e)
+            installed = None
+        GLib.idle_add(self._on_installed, installed, generation,
+                      priority=GLib.PRIORITY_LOW)
+
+    def _on_installed(self, installed, generation):
+        if generation == self._generation:
+            self._installed_loading = False
+            if installed is not None:
+                self._installed = installed
+                # show the installed state
+                if self._search_key:
+                    self.search(self._search_key)
+                else:
+                    self.on_cursor_changed(self)
+        return False
+
+    def _get_packages(self, tid):
+        """Get the grouped packages for a transaction."""
+        if tid in self._pkg_cache:
+            self._pkg_cache.move_to_end(tid)
+            return self._pkg_cache[tid]
+        mirror = self.base.history_mirror
+        pkgs = mirror.get_packages(tid)
+        if pkgs is None:
+            pkgs = self.base.get_root_backend().GetHistoryPackages(tid)
+            mirror.set_packages(tid, pkgs)
+            # the daemon tells, if the packages is installed
+            grouped = group_history_packages([tuple(pkg) for pkg in pkgs])
+            self._add_to_cache(tid, grouped)
+            return grouped
+        installed = self._get_installed()
+        if installed is None:
+            # shown without the installed state, until it is known
+            return group_history_packages(mark_installed(pkgs, frozenset()))
+        grouped = group_history_packages(mark_installed(pkgs, installed))
+        self._add_to_cache(tid, grouped)
+        return grouped
+
+    def _add_to_cache(self, tid, grouped):
+        self._pkg_cache[tid] = grouped
+        while len(self._pkg_cache) > HISTORY_CACHE_SIZE:
+            self._pkg_cache.popitem(last=False)
+
+    def _prefetch(self, tids):
+        """Get the packages for the neighbor transactions in a
+        worker thread, so they are ready when selected.
+        """
+        installed = self._get_installed()
+        tids = [tid for tid in tids if tid in self._tids and
+                tid not in self._pkg_cache and tid not in self._prefetching]
+        if not tids or installed is None:
+            return
+        self._prefetching.update(tids)
+        mirror = self.base.history_mirror
+        todo = [(tid, mirror.get_packages(tid)) for tid in tids]
+        backend = self.base.get_root_backend()
+        thread = threading.Thread(target=self._fetch,
+                                  args=(backend, todo, installed,
+                                        self._generation))
+        thread.daemon = True
+        thread.start()
+
+    def _fetch(self, backend, todo, installed, generation):
+        """Get and group history packages (worker thread)."""
+        for tid, pkgs in todo:
+            fetched = pkgs is None
+            try:
+                if fetched:
+                    pkgs = backend.get_history_packages_sync(tid)
+                    grouped = group_history_packages(
+                        [tuple(pkg) for pkg in pkgs])
+                else:
+                    grouped = group_history_packages(
+                        mark_installed(pkgs, installed))
+            except GLib.Error as e:
+                logger.debug('history: prefetch %d failed : %s', tid, e)
+                grouped = None
+            GLib.idle_add(self._on_fetched, tid, pkgs if fetched else None,
+                          grouped, generation, priority=GLib.PRIORITY_LOW)
+
+    def _on_fetched(self, tid, pkgs, grouped, generation):
+        if generation == self._generation:
+            self._prefetching.discard(tid)
+            if pkgs is not None:
+                self.base.history_mirror.set_packages(tid, pkgs)
+            if grouped is not None and tid not in self._pkg_cache:
+                self._add_to_cache(tid, grouped)
+        return False
 
     def get_selected(self):
         """Return the currently selected history tid"""
@@ -942,6 +1306,67 @@ class HistoryView(Gtk.TreeView):
             return 0
 
 
+def mark_installed(pkgs, installed):
+    """Get (pkg_id, state, is_installed) for history packages.
+
+    :param pkgs: list of (pkg_id, state, ...)
+    :param installed: set of installed nevra (pkg_id without repo)
+    """
+    return [(pkg[0], pkg[1], pkg[0].rsplit(',', 1)[0] in installed)
+            for pkg in pkgs]
+
+
+def group_history_packages(data):
+    """Group the packages in a history transaction by state.
+
+    Updated packages is paired with the package updating it.
+
+    :param data: list of (pkg_id, state, is_installed)
+    :return: list of (state, [pkg_list, ...]) in HISTORY_SORT_ORDER
+    """
+    # Order by package name.arch
+    names = {}
+    names_pair = {}
+    for elem in data:
+        pkg_id, state, is_inst = elem
+        (n, e, v, r, a, repo_id) = str(pkg_id).split(',')
+        na = "%s.%s" % (n, a)
+        if state in const.HISTORY_UPDATE_STATES:  # part of a pair
+            if na in names_pair:
+                # this is the updating pkg
+                if state in const.HISTORY_NEW_STATES:
+                    names_pair[na].insert(0, elem)  # add first in list
+                else:
+                    names_pair[na].append(elem)
+            else:
+                names_pair[na] = [elem]
+        else:
+            names[na] = [elem]
+
+    # order by primary state
+    states = {}
+    # pkgs without relatives
+    for na in sorted(list(names)):
+        pkg_list = names[na]
+        pkg_id, state, is_inst = pkg_list[
+            0]  # Get first element (the primary (new) one )
+        if state in states:
+            states[state].append(pkg_list)
+        else:
+            states[state] = [pkg_list]
+    # pkgs with releatives
+    for na in sorted(list(names_pair)):
+        pkg_list = names_pair[na]
+        pkg_id, state, is_inst = pkg_list[
+            0]  # Get first element (the primary (new) one )
+        if state in states:
+            states[state].append(pkg_list)
+        else:
+            states[state] = [pkg_list]
+    return [(state, states[state]) for state in const.HISTORY_SORT_ORDER
+            if state in states]
+
+
 class HistoryPackageView(Gtk.TreeView):
     """ History Package View Class"""
     def __init__(self, base):
@@ -964,69 +1389,53 @@ class HistoryPackageView(Gtk.TreeView):
     def reset(self):
         self.model.clear()
 
-    def populate(self, data):
+    def populate_search(self, key, result, missing=0):
+        """Populate the view with the transactions with a package.
+
+        :param key: the package name or name.arch
+        :param result: list of (date/time, grouped packages)
+        :param missing: number of transactions, not searched yet
+        """
         self.model.clear()
-        # Order by package name.arch
-        names = {}
-        names_pair = {}
-        for elem in data:
-            pkg_id, state, is_inst = elem
-            (n, e, v, r, a, repo_id) = str(pkg_id).split(',')
-            na = "%s.%s" % (n, a)
-            if state in const.HISTORY_UPDATE_STATES:  # part of a pair
-                if na in names_pair:
-                    # this is the updating pkg
-                    if state in const.HISTORY_NEW_STATES:
-                        names_pair[na].insert(0, elem)  # add first in list
-                    else:
-                        names_pair[na].append(elem)
-                else:
-                    names_pair[na] = [elem]
-            else:
-                names[na] = [elem]
-
-        # order by primary state
-        states = {}
-        # pkgs without relatives
-        for na in sorted(list(names)):
-            pkg_list = names[na]
-            pkg_id, state, is_inst = pkg_list[
-                0]  # Get first element (the primary (new) one )
-            if state in states:
-                states[state].append(pkg_list)
-            else:
-                states[state] = [pkg_list]
-        # pkgs with releatives
-        for na in sorted(list(names_pair)):
-            pkg_list = names_pair[na]
-            pkg_id, state, is_inst = pkg_list[
-                0]  # Get first element (the primary (new) one )
-            if state in states:
-                states[state].append(pkg_list)
-            else:
-                states[state] = [pkg_list]
-        # apply packages to model in right order
-        for state in const.HISTORY_SORT_ORDER:
-            if state in states:
-                num = len(states[state])
-                cat = self.model.append(
-                    None, ["<b>%s (%i)</b>" %
-                           (const.HISTORY_STATE_LABLES[state], num)])
-                for pkg_list in states[state]:
-                    pkg_id, st, is_inst = pkg_list[0]
-                    if is_inst:
-                        name = '<span foreground="%s">%s</span>' % (
-                            CONFIG.conf.color_install,
-                            misc.pkg_id_to_full_name(pkg_id))
-                    else:
-                        name = misc.pkg_id_to_full_name(pkg_id)
-                    pkg_cat = self.model.append(cat, [name])
-                    if len(pkg_list) == 2:
-                        pkg_id, st, is_inst = pkg_list[1]
-                        name = misc.pkg_id_to_full_name(pkg_id)
-                        self.model.append(pkg_cat, [name])
+        label = "<b>%s (%i)</b>" % (GLib.markup_escape_text(key), len(result))
+        if missing:
+            label += ' ' + ngettext('(%d transaction not searched)',
+                                    '(%d transactions not searched)',
+                                    missing) % missing
+        cat = self.model.append(None, [label])
+        for dt, states in result:
+            trans = self.model.append(cat, [dt.replace('T', ' ')])
+            self._add_states(trans, states)
         self.expand_all()
 
+    def populate(self, states):
+        """Populate the view with grouped packages
+        (see group_history_packages).
+        """
+        self.model.clear()
+        self._add_states(None, states)
+        self.expand_all()
+
+    def _add_states(self, parent, states):
+        for state, pkg_lists in states:
+            num = len(pkg_lists)
+            cat = self.model.append(
+                parent, ["<b>%s (%i)</b>" %
+                         (const.HISTORY_STATE_LABLES[state], num)])
+            for pkg_list in pkg_lists:
+                pkg_id, st, is_inst = pkg_list[0]
+                if is_inst:
+                    name = '<span foreground="%s">%s</span>' % (
+                        CONFIG.conf.color_install,
+                        misc.pkg_id_to_full_name(pkg_id))
+                else:
+                    name = misc.pkg_id_to_full_name(pkg_id)
+                pkg_cat = self.model.append(cat, [name])
+                if len(pkg_list) == 2:
+                    pkg_id, st, is_inst = pkg_list[1]
+                    name = misc.pkg_id_to_full_name(pkg_id)
+                    self.model.append(pkg_cat, [name])
+
 
 class RepoView(SelectionView):
     """
@@ -1161,6 +1570,7 @@ class GroupView(Gtk.TreeView):
         self.queueView = qview
         self.currentCategory = None
         self._groups = None
+        self._pix_cache = {}  # grp_id -> scaled pixbuf (None = no icon)
         self.selected_group = None
         self.connect('cursor-changed', self.on_cursor_changed)
 
@@ -1263,6 +1673,14 @@ class GroupView(Gtk.TreeView):
         self.thaw_child_notify()
         self.selected_group = None
 
+    def get_expanded_groups(self):
+        """Get the ids of the groups in the expanded categories."""
+        grp_ids = []
+        for cat_row in self.model:
+            if self.row_expanded(cat_row.path):
+                grp_ids.extend(row[0].id for row in cat_row.iterchildren())
+        return grp_ids
+
     def queue_pixbuf(self, column, cell, model, iterator, data=None):
         """
         Cell Data function for
@@ -1289,23 +1707,32 @@ class GroupView(Gtk.TreeView):
         if recent Value is True.
         """
         obj = model.get_value(iterator, 0)
-        pix = None
-        fn = "/usr/share/pixmaps/comps/%s.png" % obj.id
-        if os.access(fn, os.R_OK):
-            pix = self._get_pix(fn)
-        else:  # Try to get the parent icon
+        pix = self._get_group_pix(obj.id)
+        if pix is None:  # Try to get the parent icon
             parent = model.iter_parent(iterator)
             if parent:
                 cat_id = model[parent][0].id  # get the parent cat_id
-                fn = "/usr/share/pixmaps/comps/%s.png" % cat_id
-                if os.access(fn, os.R_OK):
-                    pix = self._get_pix(fn)
+                pix = self._get_group_pix(cat_id)
         if pix:
             cell.set_property('visible', True)
             cell.set_property('pixbuf', pix)
         else:
             cell.set_property('visible', False)
 
+    def _get_group_pix(self, grp_id):
+        '''
+        Get the scaled icon for a group/category id, None if it has no icon.
+        Icons are only loaded once, missing icons are cached too.
+        @param grp_id:
+        '''
+        if grp_id not in self._pix_cache:
+            fn = "/usr/share/pixmaps/comps/%s.png" % grp_id
+            if os.access(fn, os.R_OK):
+                self._pix_cache[grp_id] = self._get_pix(fn)
+            else:
+                self._pix_cache[grp_id] = None
+        return self._pix_cache[grp_id]
+
     def _get_pix(self, fn):
         '''
         Get a pix buffer from a file, resize it to 24 px, if needed
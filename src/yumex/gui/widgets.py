@@ -27,7 +27,6 @@ from gi.repository import Gtk, Gio, GLib
 from gi.repository import Gdk
 from gi.repository import GObject
 from gi.repository import Pango
-import hawkey
 
 from yumex.misc import _, CONFIG
 import yumex.const as const
@@ -37,6 +36,8 @@ logger = logging.getLogger('yumex.gui.widget')
 G_TRUE = GLib.Variant.new_boolean(True)
 G_FALSE = GLib.Variant.new_boolean(False)
 
+PROGRESS_FPS = 10  # max. number of progress updates per second
+
 
 class InfoProgressBar:
 
@@ -107,6 +108,72 @@ class InfoProgressBar:
                 self.info(_("Getting Package Metadata"))
 
 
+class ProgressAggregator:
+    """Show progress from the daemon signals at a capped frame rate.
+
+    The signal handlers only record the latest state, it is shown in the
+    InfoProgressBar at most PROGRESS_FPS times per second. The sublabel
+    text can be given as a callable, so it is only formatted when shown.
+    """
+
+    def __init__(self, infobar, fps=PROGRESS_FPS):
+        self.infobar = infobar
+        self.interval = int(1000 / fps)
+        self._sub = None  # pending sublabel text (or callable)
+        self._frac = None  # pending (frac, label)
+        self._source_id = None
+        self.signals = 0  # number of recorded signals
+        self.updates = 0  # number of infobar updates
+
+    def set_sub(self, msg):
+        """Set the sublabel text (or a callable returning it)."""
+        self._sub = msg
+        self._changed()
+
+    def set_progress(self, frac, label=None):
+        self._frac = (frac, label)
+        self._changed()
+
+    def _changed(self):
+        self.signals += 1
+        if self._source_id is None:
+            self._source_id = GLib.timeout_add(self.interval, self._on_timeout)
+
+    def _on_timeout(self):
+        self._source_id = None
+        self.flush()
+        return False
+
+    def flush(self):
+        """Show the pending state now."""
+        if self._source_id is not None:
+            GLib.source_remove(self._source_id)
+            self._source_id = None
+        if self._sub is not None:
+            msg = self._sub() if callable(self._sub) else self._sub
+            self._sub = None
+            if msg is not None:
+                self.infobar.info_sub(msg)
+        if self._frac is not None:
+            frac, label = self._frac
+            self._frac = None
+            self.infobar.set_progress(frac, label=label)
+        self.updates += 1
+
+    def cancel(self):
+        """Drop the pending state (the infobar is hidden)."""
+        if self._source_id is not None:
+            GLib.source_remove(self._source_id)
+            self._source_id = None
+        self._sub = None
+        self._frac = None
+        if self.signals:
+            logger.debug('progress: %d signals shown in %d updates',
+                         self.signals, self.updates)
+        self.signals = 0
+        self.updates = 0
+
+
 class SearchBar(GObject.GObject):
     """Handling the search UI."""
 
@@ -592,10 +659,11 @@ class PackageInfo(PackageDetails):
         self.base.set_working(False, False)
 
     def _write_update_info(self, upd_info):
+        import hawkey  # only needed here, so don't load it at startup
         head = ""
         head += ("%14s " % _("Release")) + ": %(id)s\n"
         head += ("%14s " % _("Type")) + ": "
-        head += const.ADVISORY_TYPES[upd_info['type']] + "\n"
+        head += const.get_advisory_types()[upd_info['type']] + "\n"
         #head += ("%14s " % _("Status")) + ": %(status)s\n"
         head += ("%14s " % _("Issued")) + ": %(updated)s\n"
         head = head % upd_info
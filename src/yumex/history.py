@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+#    Yum Exteder (yumex) - A graphic package management tool
+#    Copyright (C) 2013 -2014 Tim Lauridsen < timlau<AT>fedoraproject<DOT>org >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Local mirror of the dnf history."""
+
+import bisect
+import datetime
+import gzip
+import json
+import logging
+import os.path
+
+from gi.repository import GLib
+
+from yumex.misc import CONFIG
+
+logger = logging.getLogger('yumex.history')
+
+MIRROR_VERSION = 1
+SAVE_DELAY = 5  # seconds, to save changes in one write
+
+
+class HistoryIndex:
+    """Index from package name and name.arch to the packages in the
+    history transactions, so a search don't have to look in the package
+    lists of all transactions.
+    """
+
+    def __init__(self):
+        self._index = {}  # name.arch -> sorted [(tid, state, evr), ...]
+        self._arches = {}  # name -> set of name.arch
+
+    def clear(self):
+        self._index = {}
+        self._arches = {}
+
+    def add(self, tid, pkgs):
+        """Add the packages in a transaction.
+
+        :param pkgs: list of [pkg_id, state]
+        """
+        for pkg_id, state in pkgs:
+            (n, e, v, r, a, repo_id) = str(pkg_id).split(',')
+            na = '%s.%s' % (n, a)
+            self._arches.setdefault(n, set()).add(na)
+            entries = self._index.setdefault(na, [])
+            entry = (tid, state, '%s,%s,%s' % (e, v, r))
+            pos = bisect.bisect_left(entries, entry)
+            if pos == len(entries) or entries[pos] != entry:
+                entries.insert(pos, entry)
+
+    def lookup(self, key):
+        """Get the packages with a package name or name.arch, newest
+        transaction first.
+
+        :return: list of (tid, pkg_id, state), the pkg_id is without
+                 the repo_id
+        """
+        result = []
+        for na in self._arches.get(key, (key,)):
+            if na not in self._index:
+                continue
+            n, a = na.rsplit('.', 1)
+            result.extend((tid, '%s,%s,%s,' % (n, evr, a), state)
+                          for tid, state, evr in self._index[na])
+        result.sort(key=lambda elem: elem[0], reverse=True)
+        return result
+
+
+class HistoryMirror:
+    """Local copy of the dnf history transactions.
+
+    The dnf history is append-only, so only the transactions newer than
+    the last stored one is fetched from the daemon. The package lists
+    is stored, when they have been fetched once.
+
+    The mirror is stored as gzip'ed json in the config dir and is bounded
+    to the newest history_mirror_size transactions.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(CONFIG.conf_dir, 'history.json.gz')
+        self.path = path
+        self._loaded = False
+        self._days = 0  # number of days fetched by the last full sync
+        self._transactions = {}  # tid -> [dt, [[pkg_id, state], ...]]
+        self._save_id = None
+        self.index = HistoryIndex()
+
+    def load(self):
+        """Load the mirror file."""
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        try:
+            with gzip.open(self.path, 'rt') as fp:
+                data = json.load(fp)
+            if data.get('version') != MIRROR_VERSION:
+                logger.debug('history mirror: version changed, ignored')
+                return
+            self._days = data['days']
+            self._transactions = {tid: [dt, pkgs] for tid, dt, pkgs
+                                  in data['transactions']}
+            self._build_index()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.debug('history mirror: %s is not valid : %s',
+                         self.path, e)
+            self._days = 0
+            self._transactions = {}
+            self.index.clear()
+        logger.debug('history mirror: %d transactions loaded',
+                     len(self._transactions))
+
+    def save(self):
+        """Write the mirror file, if there is changes."""
+        if self._save_id is None:
+            return False
+        GLib.source_remove(self._save_id)
+        self._save_id = None
+        data = {'version': MIRROR_VERSION,
+                'days': self._days,
+                'transactions': [[tid, dt, pkgs] for tid, (dt, pkgs)
+                                 in sorted(self._transactions.items())]}
+        try:
+            tmp_path = self.path + '.tmp'
+            with gzip.open(tmp_path, 'wt') as fp:
+                json.dump(data, fp, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error('history mirror: could not write %s : %s',
+                         self.path, e)
+        return False
+
+    def _build_index(self):
+        self.index.clear()
+        for tid, (dt, pkgs) in sorted(self._transactions.items()):
+            if pkgs:
+                self.index.add(tid, pkgs)
+
+    def _changed(self):
+        if self._save_id is None:
+            self._save_id = GLib.timeout_add_seconds(SAVE_DELAY, self.save)
+
+    def sync(self, backend, days):
+        """Get the new transactions from the daemon.
+
+        :param backend: the root backend
+        :param days: number of days of history to get
+        """
+        if not self._loaded:
+            self.load()
+        if self._transactions and days <= self._days:
+            # only the days since the newest transaction
+            newest = max(dt for dt, pkgs in self._transactions.values())
+            since = datetime.datetime.strptime(newest[:10], '%Y-%m-%d')
+            fetch_days = (datetime.datetime.now() - since).days + 1
+        else:
+            fetch_days = days
+        result = backend.GetHistoryByDays(0, fetch_days)
+        added = 0
+        for tid, dt in result:
+            if tid in self._transactions:
+                if self._transactions[tid][0] != dt:
+                    # the history db has been replaced, start over
+                    logger.debug('history mirror: history db changed')
+                    self._transactions = {}
+                    self._days = 0
+                    self.index.clear()
+                    return self.sync(backend, days)
+                continue
+            self._transactions[tid] = [dt, None]
+            added += 1
+        if fetch_days == days:
+            self._days = days
+        self._prune()
+        logger.debug('history mirror: %d new transactions (%d days)',
+                     added, fetch_days)
+        if added or fetch_days == days:
+            self._changed()
+
+    def _prune(self):
+        size = CONFIG.conf.history_mirror_size
+        if len(self._transactions) > size:
+            for tid in sorted(self._transactions)[:-size]:
+                del self._transactions[tid]
+            self._build_index()
+
+    def get_transactions(self, days):
+        """Get the (tid, dt) of the transactions in the last days."""
+        since = (datetime.datetime.now() -
+                 datetime.timedelta(days=days)).strftime('%Y-%m-%d')
+        return [(tid, dt) for tid, (dt, pkgs)
+                in sorted(self._transactions.items()) if dt >= since]
+
+    def get_date(self, tid):
+        """Get the date/time of a transaction."""
+        return self._transactions[tid][0]
+
+    def get_missing(self, tids):
+        """Get the tids, where the packages is not in the mirror."""
+        return [tid for tid in tids if tid in self._transactions and
+                self._transactions[tid][1] is None]
+
+    def get_packages(self, tid):
+        """Get the [pkg_id, state] of the packages in a transaction,
+        None if they are not in the mirror.
+        """
+        if tid in self._transactions:
+            return self._transactions[tid][1]
+        return None
+
+    def set_packages(self, tid, pkgs):
+        """Store the packages in a transaction.
+
+        :param pkgs: GetHistoryPackages result [(pkg_id, state, is_inst)]
+        """
+        if tid in self._transactions and \
+                self._transactions[tid][1] is None:
+            self._transactions[tid][1] = [[pkg_id, state]
+                                          for pkg_id, state, is_inst in pkgs]
+            self.index.add(tid, self._transactions[tid][1])
+            self._changed()
@@ -21,18 +21,21 @@
 import time
 import configparser
 import gettext
+import importlib.util
 import locale
 import logging
+import math
 import os.path
 import re
 import subprocess
 import sys
 
-from gi.repository import Gtk, Gdk, Notify
+from gi.repository import Gtk, Gdk
 
 import dnfdaemon.client
 
 import yumex.config as config
+from yumex.tracing import traced
 
 LOCALE_DIR = os.path.join(sys.prefix, 'share', 'locale')
 locale.setlocale(locale.LC_ALL, '')
@@ -44,6 +47,28 @@ ngettext = gettext.ngettext
 
 logger = logging.getLogger('yumex.misc')
 
+
+def lazy_import(name):
+    """Import a module, but first load it when one of its attributes is used.
+
+    Used to keep heavy modules out of the startup path, until they are
+    really needed.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    # make 'import a.b' work for the lazy module too
+    parent, _sep, child = name.rpartition('.')
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
+
+
 class QueueEmptyError(Exception):
 
     def __init__(self):
@@ -93,6 +118,35 @@ def pkg_id_to_full_name(pkg_id):
         return "%s-%s-%s.%s" % (n, v, r, a)
 
 
+# version segments, as rpmvercmp splits them (other chars are separators)
+VERSION_SEGMENT_RE = re.compile(r'~|\^|[0-9]+|[a-zA-Z]+')
+
+
+def version_key(version):
+    """Get a sort key for a version or release string.
+
+    The keys compare like rpmvercmp() compares the strings:
+    tilde < end of string < caret < alpha segment < numeric segment
+    """
+    key = []
+    for seg in VERSION_SEGMENT_RE.findall(version):
+        if seg == '~':
+            key.append((0,))
+        elif seg == '^':
+            key.append((2,))
+        elif seg.isdigit():
+            key.append((4, int(seg)))
+        else:
+            key.append((3, seg))
+    key.append((1,))  # end of string
+    return tuple(key)
+
+
+def evr_key(epoch, version, release):
+    """Get a sort key for an (epoch, version, release)."""
+    return (int(epoch or 0), version_key(version), version_key(release))
+
+
 def color_floats(spec):
     rgba = Gdk.RGBA()
     rgba.parse(spec)
@@ -105,6 +159,32 @@ def get_color(spec):
     return rgba
 
 
+# package action -> color option in YumexConf
+ACTION_COLOR_OPTIONS = {'u': 'color_update',
+                        'o': 'color_obsolete',
+                        'do': 'color_downgrade',
+                        'r': 'color_install'}
+_action_colors = {}
+
+
+def update_action_colors():
+    """(Re)build the action -> Gdk.RGBA table from the color options.
+
+    Must be called when the color options has been changed.
+    """
+    _action_colors.clear()
+    for action, option in ACTION_COLOR_OPTIONS.items():
+        _action_colors[action] = get_color(getattr(CONFIG.conf, option))
+    _action_colors[None] = get_color(CONFIG.conf.color_normal)
+
+
+def get_action_color(action):
+    """Get the Gdk.RGBA for a package action (shared, don't modify it)."""
+    if not _action_colors:
+        update_action_colors()
+    return _action_colors.get(action, _action_colors[None])
+
+
 def rgb_to_hex(r, g, b):
     if isinstance(r, float):
         r *= 255
@@ -171,11 +251,14 @@ def ExceptionHandler(func):
 
 def TimeFunction(func):
     """
-    This decorator catch yum exceptions and send fatal signal to frontend
+    This decorator log the time used by a function, it is recorded as a
+    span, when profiling (see yumex.tracing)
     """
+    traced_func = traced()(func)
+
     def newFunc(*args, **kwargs):
         t_start = time.time()
-        rc = func(*args, **kwargs)
+        rc = traced_func(*args, **kwargs)
         t_end = time.time()
         name = func.__name__
         logger.debug("%s took %.2f sec", name, t_end - t_start)
@@ -229,7 +312,17 @@ def format_number(number, SI=0, space=' '):
     return(fmt % (float(number or 0), space, symbols[depth]))
 
 
+def format_duration(seconds):
+    """Format seconds as h:mm:ss or m:ss."""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return '%d:%02d:%02d' % (hours, minutes, seconds)
+    return '%d:%02d' % (minutes, seconds)
+
+
 def notify(summary, body):
+    from gi.repository import Notify
     Notify.init('Yum Extender')
     icon = "yumex-dnf"
     notification = Notify.Notification.new(summary, body, icon)
@@ -273,12 +366,22 @@ class YumexConf(config.BaseConfig):
     color_obsolete = config.Option('#ff7800') 
 
     history_days = config.IntOption(180)
+    # max. number of transactions in the local history mirror
+    history_mirror_size = config.IntOption(5000)
     newest_only = config.BoolOption(True)
     clean_unused = config.BoolOption(False)
     update_interval = config.IntOption(60)
     autocheck_updates = config.BoolOption(False)
     system_refresh = config.Option('2000-01-01 00:01')
     refresh_interval = config.IntOption(12)
+    # let the updater refresh the metadata in the background
+    background_refresh = config.BoolOption(True)
+    # allow background refresh on metered network connections
+    refresh_metered = config.BoolOption(False)
+    # load installed/available packages in the background, when idle
+    preload_packages = config.BoolOption(True)
+    # write the timing of transactions to telemetry.jsonl in the config dir
+    transaction_telemetry = config.BoolOption(True)
     # headerbar is default if running gnome
     hb_default = is_gnome()
     headerbar = config.BoolOption(hb_default)
@@ -318,6 +421,8 @@ class Config(object):
     WRITE_ALWAYS = ['autostart', 'update_interval',
                     'update_startup_delay', 'autocheck_updates',
                     'update_notify', 'update_showicon']
+    # timestamps shared between yumex and the updater, the newest one wins
+    SHARED_TIMESTAMPS = ['system_refresh']
 
     def __init__(self):
         object.__init__(self)
@@ -346,9 +451,187 @@ class Config(object):
             self.write()
 
     def write(self):
+        self._merge_shared()
         fp = open(self.conf_file, "w")
         self.conf.write(fp, "yumex", Config.WRITE_ALWAYS)
         fp.close()
 
+    def _read_file(self):
+        """Get a parser with the current content of the config file."""
+        parser = configparser.ConfigParser()
+        if os.path.exists(self.conf_file):
+            parser.read(self.conf_file)
+        if not parser.has_section('yumex'):
+            parser.add_section('yumex')
+        return parser
+
+    def _merge_shared(self):
+        """Don't overwrite a newer shared timestamp written by another
+        yumex process, while this one was running."""
+        parser = self._read_file()
+        for name in Config.SHARED_TIMESTAMPS:
+            if parser.has_option('yumex', name):
+                value = parser.get('yumex', name)
+                # the timestamps are in a sortable format
+                if value > getattr(self.conf, name):
+                    setattr(self.conf, name, value)
+
+    def read_option(self, name):
+        """Re-read a single option from the config file."""
+        parser = self._read_file()
+        if parser.has_option('yumex', name):
+            setattr(self.conf, name, parser.get('yumex', name))
+        return getattr(self.conf, name)
+
+    def write_option(self, name, value):
+        """Write a single option to the config file, leaving the other
+        options in the file untouched.
+        """
+        setattr(self.conf, name, value)
+        option = self.conf.optionobj(name)
+        parser = self._read_file()
+        parser.set('yumex', name, option.tostring(getattr(self.conf, name)))
+        fp = open(self.conf_file, "w")
+        parser.write(fp)
+        fp.close()
+
+
+class StartupTimeline:
+    """Named milestones, showing where the startup time is used."""
+
+    def __init__(self):
+        self.start_time = time.monotonic()
+        self.milestones = []
+
+    def start(self, start_time):
+        """Set the start time (taken by the launcher before any imports)."""
+        self.start_time = start_time
+
+    def mark(self, name):
+        """Record a milestone, only the first time a name is seen counts."""
+        if name in [mname for mname, _elapsed in self.milestones]:
+            return
+        elapsed = time.monotonic() - self.start_time
+        self.milestones.append((name, elapsed))
+        logger.debug('startup : %-20s %.3f s', name, elapsed)
+
+    def as_dict(self):
+        return {'milestones': [{'name': name, 'time': round(elapsed, 4)}
+                               for name, elapsed in self.milestones]}
+
+
+TIMELINE = StartupTimeline()
+
+
+class DownloadMeter:
+    """Download rate and ETA for a download batch.
+
+    The current rate is an exponentially weighted moving average with a
+    time constant of RATE_SMOOTHING seconds, so it follows changes in
+    the speed without jumping around. When no data has been received for
+    STALL_TIME seconds, the download is stalled and no ETA is given.
+    """
+
+    RATE_SMOOTHING = 5.0  # seconds
+    MIN_SAMPLE_TIME = 0.5  # seconds between rate samples
+    STALL_TIME = 5.0  # seconds
+
+    def __init__(self):
+        self.start(0)
+
+    def start(self, total_bytes, now=None):
+        """Start a new download batch."""
+        now = time.monotonic() if now is None else now
+        self.total_bytes = total_bytes
+        self.start_time = now
+        self.end_time = None
+        self.received = 0
+        self.rate = 0.0  # smoothed bytes/sec
+        self.peak_rate = 0.0
+        self._sample_time = now
+        self._sample_bytes = 0
+        self._last_progress = now
+
+    def update(self, frac, now=None):
+        """Update with the fraction of the batch downloaded."""
+        now = time.monotonic() if now is None else now
+        received = int(frac * self.total_bytes)
+        if received > self.received:
+            self.received = received
+            self._last_progress = now
+        elapsed = now - self._sample_time
+        if elapsed >= self.MIN_SAMPLE_TIME:
+            sample = (self.received - self._sample_bytes) / elapsed
+            if self._sample_bytes == 0 and self.rate == 0.0:
+                self.rate = sample  # first sample
+            else:
+                alpha = 1.0 - math.exp(-elapsed / self.RATE_SMOOTHING)
+                self.rate += alpha * (sample - self.rate)
+            self.peak_rate = max(self.peak_rate, self.rate)
+            self._sample_time = now
+            self._sample_bytes = self.received
+
+    def finish(self, now=None):
+        """The batch is done, return True the first time."""
+        if self.end_time is not None or not self.total_bytes:
+            return False
+        self.end_time = time.monotonic() if now is None else now
+        return True
+
+    @property
+    def elapsed(self):
+        end = time.monotonic() if self.end_time is None else self.end_time
+        return end - self.start_time
+
+    @property
+    def average_rate(self):
+        if self.elapsed > 0:
+            return self.received / self.elapsed
+        return 0.0
+
+    def is_stalled(self, now=None):
+        now = time.monotonic() if now is None else now
+        return now - self._last_progress >= self.STALL_TIME
+
+    def eta(self, now=None):
+        """Seconds left of the batch, None if unknown or stalled."""
+        if self.rate <= 0.0 or self.is_stalled(now):
+            return None
+        return (self.total_bytes - self.received) / self.rate
+
+    def __str__(self):
+        """Current rate and ETA, fx. '1.2 MB/s, 0:35 left'."""
+        if self.is_stalled():
+            return _('stalled')
+        rate = '%sB/s' % format_number(self.rate)
+        eta = self.eta()
+        if eta is None:
+            return rate
+        return _('%s, %s left') % (rate, format_duration(eta))
+
+    def summary(self):
+        """Summary for the log."""
+        return ('%sB in %.1f s, average %sB/s, peak %sB/s' %
+                (format_number(self.received), self.elapsed,
+                 format_number(self.average_rate),
+                 format_number(self.peak_rate)))
+
+
+class LazyConfig:
+    """Proxy for the Config instance.
+
+    The config file is first read (and created) when a setting is used,
+    not when yumex.misc is imported.
+    """
+
+    def __init__(self):
+        self._config = None
+
+    def __getattr__(self, name):
+        if self._config is None:
+            self._config = Config()
+            TIMELINE.mark('config-loaded')
+        return getattr(self._config, name)
+
 
-CONFIG = Config()
+CONFIG = LazyConfig()
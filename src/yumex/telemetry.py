@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+#    Yum Exteder (yumex) - A graphic package management tool
+#    Copyright (C) 2013 -2014 Tim Lauridsen < timlau<AT>fedoraproject<DOT>org >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Timing of the applied transactions.
+
+Each transaction appends a json line to telemetry.jsonl in the config dir.
+Show a summary with:
+
+    tools/telemetry.py [--file FILE]
+
+The install time of the packages is learned in install_times.json, to
+predict the time left of a running transaction.
+"""
+
+import datetime
+import json
+import logging
+import math
+import os.path
+import time
+
+from yumex.misc import CONFIG
+
+logger = logging.getLogger('yumex.telemetry')
+
+TELEMETRY_FILE = 'telemetry.jsonl'
+INSTALL_TIMES_FILE = 'install_times.json'
+
+# TransactionEvent events starting a phase, in the order they are send
+PHASES = ['start-run', 'download', 'signature-check', 'run-test-transaction',
+          'run-transaction', 'verify']
+END_EVENTS = ['end-run', 'fail']
+
+
+def get_path():
+    return os.path.join(CONFIG.conf_dir, TELEMETRY_FILE)
+
+
+class TransactionTimer:
+    """Time the phases of a transaction from the TransactionEvent
+    signals.
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self.start_time = None
+        self.depsolve_start = None
+        self.depsolve = None
+        self.packages = 0
+        self.bytes = 0
+        self.phases = {}  # phase -> seconds
+        self._phase = None  # (phase, start time)
+
+    def start_depsolve(self):
+        """A new transaction is being build."""
+        self._reset()
+        self.depsolve_start = time.monotonic()
+
+    def end_depsolve(self):
+        if self.depsolve_start is not None:
+            self.depsolve = time.monotonic() - self.depsolve_start
+
+    def begin(self, transaction):
+        """The transaction is about to run.
+
+        :param transaction: the transaction result [(sub, [pkg, ...]), ...]
+        """
+        self.start_time = time.monotonic()
+        self.packages = sum(len(pkgs) for sub, pkgs in transaction)
+
+    def add_bytes(self, num_bytes):
+        self.bytes += num_bytes
+
+    def event(self, event):
+        """Handle a TransactionEvent."""
+        if self.start_time is None:
+            return
+        now = time.monotonic()
+        if self._phase and (event in PHASES or event in END_EVENTS):
+            phase, start = self._phase
+            # some phases can be repeated (fx. more download batches)
+            self.phases[phase] = self.phases.get(phase, 0.0) + now - start
+            self._phase = None
+        if event in PHASES:
+            self._phase = (event, now)
+
+    def finish(self, rc):
+        """The transaction is done, write the telemetry line.
+
+        :param rc: the RunTransaction return code
+        """
+        if self.start_time is None:
+            return
+        self.event('end-run')  # close the current phase
+        # the time in the confirmation dialog is not counted
+        total = time.monotonic() - self.start_time + (self.depsolve or 0.0)
+        record = {
+            'time': datetime.datetime.now().isoformat(timespec='seconds'),
+            'result': rc,
+            'packages': self.packages,
+            'bytes': self.bytes,
+            'depsolve': _round(self.depsolve),
+            'total': _round(total),
+            'phases': {phase: _round(secs)
+                       for phase, secs in self.phases.items()}}
+        self._reset()
+        if not CONFIG.conf.transaction_telemetry:
+            return
+        try:
+            with open(get_path(), 'a') as fp:
+                fp.write(json.dumps(record, sort_keys=True) + '\n')
+        except OSError as e:
+            logger.error('could not write telemetry : %s', e)
+
+
+class InstallTimeModel:
+    """Learned rpm install time per package name and per size bucket.
+
+    The size buckets are powers of 2 of the package size. Packages never
+    seen before are predicted from their size bucket. Without any data
+    for the bucket, a fixed rate and overhead is used.
+    """
+
+    DEFAULT_OVERHEAD = 0.2  # seconds per package
+    DEFAULT_RATE = 50 * 1024 * 1024  # bytes per second
+    LEARN_RATE = 0.3  # weight of the newest duration for a package
+    MAX_BUCKET_COUNT = 50  # buckets follow the newest 50 packages
+    MAX_PACKAGES = 5000
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(CONFIG.conf_dir, INSTALL_TIMES_FILE)
+        self.packages = {}  # name -> seconds
+        self.buckets = {}  # bucket -> [mean seconds, count]
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as fp:
+                data = json.load(fp)
+            self.packages = data['packages']
+            self.buckets = data['buckets']
+        except (OSError, ValueError, KeyError) as e:
+            if os.path.exists(self.path):
+                logger.debug('%s is not valid : %s', self.path, e)
+
+    def save(self):
+        # the packages are kept in the order they were last learned,
+        # forget the ones not seen for the longest time
+        for name in list(self.packages)[:-self.MAX_PACKAGES]:
+            del self.packages[name]
+        try:
+            with open(self.path, 'w') as fp:
+                json.dump({'packages': self.packages,
+                           'buckets': self.buckets}, fp)
+        except OSError as e:
+            logger.error('could not write %s : %s', self.path, e)
+
+    @staticmethod
+    def _bucket(size):
+        if not size:
+            return 'none'  # size not known
+        return str(int(math.log2(size)))
+
+    def predict(self, name, size):
+        """Predicted install time in seconds."""
+        if name in self.packages:
+            return self.packages[name]
+        bucket = self.buckets.get(self._bucket(size))
+        if bucket:
+            return bucket[0]
+        return self.DEFAULT_OVERHEAD + (size or 0) / self.DEFAULT_RATE
+
+    def learn(self, name, size, secs):
+        """Learn the install time of a package."""
+        if name in self.packages:
+            # move it last, so it is the newest
+            old = self.packages.pop(name)
+            self.packages[name] = old + self.LEARN_RATE * (secs - old)
+        else:
+            self.packages[name] = secs
+        mean, count = self.buckets.get(self._bucket(size), (0.0, 0))
+        count = min(count + 1, self.MAX_BUCKET_COUNT)
+        self.buckets[self._bucket(size)] = [mean + (secs - mean) / count,
+                                            count]
+
+
+class InstallEstimator:
+    """Progress and time left of the rpm transaction, weighted by the
+    predicted install time of the packages, instead of the count.
+    """
+
+    # RPMProgress actions, where a new transaction element is started
+    ACTIONS = ['update', 'install', 'reinstall', 'cleanup', 'erase',
+               'obsolete', 'downgrade']
+    MIN_PREDICTED = 5.0  # seconds done, before the prediction is corrected
+
+    def __init__(self):
+        self.model = None
+        self.active = False
+        self._sizes = {}  # package -> size
+        self.total = 0.0  # predicted seconds
+        self.done = 0.0  # predicted seconds of the finished elements
+        self.start_time = None
+        self._current = None  # (key, size, predicted, start time)
+
+    def begin(self, transaction):
+        """Predict the time of the transaction.
+
+        :param transaction: transaction result [(sub, [(pkg_id, size,
+                            replaces)])] as from BuildTransaction
+        """
+        if self.model is None:
+            self.model = InstallTimeModel()
+        self._sizes = {}
+        self.total = 0.0
+        for sub, pkgs in transaction:
+            for pkg_id, size, replaces in pkgs:
+                self._sizes[pkg_id] = size
+                self.total += self.model.predict(self._name(pkg_id), size)
+                # the replaced packages is cleaned up, their size is not
+                # in the transaction, use the size of the new version
+                for old_id in replaces:
+                    self._sizes.setdefault(old_id, size)
+                    self.total += self.model.predict(
+                        self._key(old_id, 'cleanup'), size)
+        self.done = 0.0
+        self.start_time = None
+        self._current = None
+        self.active = self.total > 0.0
+
+    @staticmethod
+    def _name(package):
+        return package.split(',')[0]
+
+    def _key(self, package, action):
+        """Name to learn the time of an element with."""
+        name = self._name(package)
+        return 'cleanup:' + name if action == 'cleanup' else name
+
+    def _end_current(self, now):
+        if self._current:
+            key, size, predicted, start = self._current
+            self.model.learn(key, size, now - start)
+            self.done += predicted
+            self._current = None
+
+    def update(self, package, action, te_current, te_total):
+        """Handle a RPMProgress signal.
+
+        :return: (fraction done, seconds left or None)
+        """
+        if not self.active:  # fx. no begin() for this transaction
+            return 0.0, None
+        now = time.monotonic()
+        if self.start_time is None:
+            self.start_time = now
+        if action in self.ACTIONS and \
+                (self._current is None or self._current[0] !=
+                 self._key(package, action)):
+            self._end_current(now)
+            key = self._key(package, action)
+            size = self._sizes.get(package, 0)
+            self._current = (key, size, self.model.predict(key, size), now)
+        done = self.done
+        if self._current and te_total > 0:
+            done += self._current[2] * min(te_current / te_total, 1.0)
+        frac = min(done / self.total, 1.0)
+        left = None
+        if self.done >= self.MIN_PREDICTED:
+            # correct the prediction by how it has gone so far
+            ratio = (now - self.start_time) / done
+            ratio = min(max(ratio, 0.25), 4.0)
+            left = max(self.total - done, 0.0) * ratio
+        return frac, left
+
+    def end_phase(self):
+        """The rpm transaction phase has ended."""
+        if self.active:
+            self._end_current(time.monotonic())
+
+    def finish(self, success):
+        """The transaction is done, store what is learned."""
+        if not self.active:
+            return
+        self.active = False
+        if success:
+            self.model.save()
+
+
+def _round(secs):
+    return None if secs is None else round(secs, 3)
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+#    Yum Exteder (yumex) - A graphic package management tool
+#    Copyright (C) 2013 -2014 Tim Lauridsen < timlau<AT>fedoraproject<DOT>org >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Profiling with nested spans.
+
+    with TRACER.span('filter-change', flt=flt):
+        ...
+
+Spans are only recorded, when the tracer is enabled (yumex --profile).
+The spans can be exported as a Chrome trace-event file (chrome://tracing
+or https://ui.perfetto.dev) and is summarized per span name.
+"""
+
+import json
+import os
+import threading
+import time
+
+MAX_EVENTS = 100000  # trace events kept for the export
+MAX_SAMPLES = 10000  # durations kept per span name, for the percentiles
+
+
+class _NoSpan:
+    """Used when the tracer is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+NO_SPAN = _NoSpan()
+
+
+class Span:
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.tracer._push(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *args):
+        duration = time.perf_counter_ns() - self.start
+        self.tracer._pop(self, duration)
+        return False
+
+
+class SpanStats:
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0  # ns
+        self.max = 0  # ns
+        self.samples = []  # the first MAX_SAMPLES durations
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(duration)
+
+
+class Tracer:
+    """Record nested spans, per thread."""
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []  # chrome trace events, the first MAX_EVENTS
+        self.dropped = 0  # events not kept
+        self.durations = {}  # name -> SpanStats
+        self._local = threading.local()
+        self._origin = time.perf_counter_ns()
+
+    def enable(self):
+        self.enabled = True
+        self._origin = time.perf_counter_ns()
+
+    def span(self, name, **args):
+        """Get a context manager, timing a block as a span."""
+        if not self.enabled:
+            return NO_SPAN
+        return Span(self, name, args)
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _push(self, span):
+        self._stack().append(span)
+
+    def _pop(self, span, duration):
+        stack = self._stack()
+        if stack and stack[-1] is span:
+            stack.pop()
+        args = dict(span.args)
+        if stack:
+            args['parent'] = stack[-1].name
+        # appending to a list is atomic, no locking needed
+        if len(self.events) < MAX_EVENTS:
+            self.events.append({
+                'name': span.name, 'ph': 'X', 'pid': os.getpid(),
+                'tid': threading.get_ident(),
+                'ts': (span.start - self._origin) / 1000.0,
+                'dur': duration / 1000.0,
+                'args': {key: str(value) for key, value in args.items()}})
+        else:
+            self.dropped += 1
+        stats = self.durations.get(span.name)
+        if stats is None:
+            stats = self.durations.setdefault(span.name, SpanStats())
+        stats.add(duration)
+
+    def export(self, path):
+        """Write the spans as a Chrome trace-event json file."""
+        with open(path, 'w') as fp:
+            json.dump({'traceEvents': self.events,
+                       'displayTimeUnit': 'ms',
+                       'otherData': {'dropped_events': self.dropped}}, fp)
+
+    def summary(self):
+        """Get the summary lines, the span names with the most total time
+        first.
+        """
+        lines = ['%-40s %6s %9s %9s %9s %9s' % ('span (ms)', 'count',
+                                                'total', 'p50', 'p90', 'max')]
+        totals = sorted(self.durations.items(), key=lambda x: -x[1].total)
+        for name, stats in totals:
+            values = sorted(stats.samples)
+            lines.append('%-40s %6d %9.1f %9.2f %9.2f %9.2f' % (
+                name[:40], stats.count, stats.total / 1e6,
+                values[len(values) // 2] / 1e6,
+                values[min(int(len(values) * 0.9), len(values) - 1)] / 1e6,
+                stats.max / 1e6))
+        if self.dropped:
+            lines.append('%d spans not in the trace export (max %d)' %
+                         (self.dropped, MAX_EVENTS))
+        return lines
+
+
+def traced(name=None):
+    """Decorator, running a function as a span."""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        def newFunc(*args, **kwargs):
+            if not TRACER.enabled:
+                return func(*args, **kwargs)
+            with Span(TRACER, span_name, {}):
+                return func(*args, **kwargs)
+
+        newFunc.__name__ = func.__name__
+        newFunc.__doc__ = func.__doc__
+        newFunc.__dict__.update(func.__dict__)
+        return newFunc
+    return decorator
+
+
+TRACER = Tracer()
@@ -25,6 +25,7 @@
 #    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 from _signal import SIGINT, SIGTERM, SIGHUP
 
+import datetime
 import logging
 import os
 import sys
@@ -50,6 +51,9 @@ YUMEX_BIN = '/usr/bin/yumex-dnf'
 CONF_DIR = BaseDirectory.save_config_path('yumex-dnf')
 TIMESTAMP_FILE = os.path.join(CONF_DIR, 'update_timestamp.conf')
 DELAYED_START = 5 * 60  # Seconds before first check
+REFRESH_CHECK_INTERVAL = 30 * 60  # Seconds between metadata expire checks
+REFRESH_AHEAD = datetime.timedelta(hours=1)  # refresh before it expires
+REFRESH_TIME_FMT = '%Y-%m-%d %H:%M'
 
 
 class _Notification(GObject.GObject):
@@ -176,6 +180,82 @@ class _Updater:
         self.start_update_timer()  # restart update timer if necessary
         return update_count
 
+    def __metadata_expiring(self):
+        """Check if the system metadata cache expires soon.
+
+        yumex refreshes the cache (blocking) at startup, when it is older
+        than refresh_interval, so we refresh it a little ahead of that.
+        """
+        if CONFIG.conf.refresh_interval == 0:  # cache management disabled
+            return False
+        period = datetime.timedelta(hours=CONFIG.conf.refresh_interval)
+        ahead = min(REFRESH_AHEAD, period / 4)
+        # yumex might have refreshed the cache since last time
+        last_refresh = datetime.datetime.strptime(
+            CONFIG.read_option('system_refresh'), REFRESH_TIME_FMT)
+        age = datetime.datetime.now() - last_refresh
+        return age > period - ahead
+
+    @staticmethod
+    def __network_usable():
+        """Check if the network is up and we are allowed to use it."""
+        monitor = Gio.NetworkMonitor.get_default()
+        if not monitor.get_network_available():
+            logger.debug('Network is not available')
+            return False
+        try:
+            metered = monitor.get_network_metered()
+        except AttributeError:  # GLib < 2.46 can't tell
+            metered = False
+        if metered and not CONFIG.conf.refresh_metered:
+            logger.debug('Network connection is metered')
+            return False
+        return True
+
+    def __refresh_metadata(self):
+        """Refresh the system metadata cache in the background."""
+        if not self.__metadata_expiring() or not self.__network_usable():
+            return
+        logger.debug('Refreshing repository metadata')
+        try:
+            if self.__backend.Lock():
+                try:
+                    rc = self.__backend.ExpireCache()
+                finally:
+                    self.__backend.Unlock()
+            else:
+                # yumex or another dnfdaemon client is running
+                logger.debug('Could not get the dnfdaemon lock')
+                return
+        except dnfdaemon.client.DaemonError as error:
+            logger.debug('Error refreshing metadata: [%s]', str(error))
+            return
+        if rc:
+            now = datetime.datetime.now().strftime(REFRESH_TIME_FMT)
+            # only touch system_refresh, the config is shared with yumex
+            CONFIG.write_option('system_refresh', now)
+            logger.debug('Repository metadata refreshed : %s', now)
+        else:
+            logger.debug('Could not refresh the repository metadata')
+
+    def __refresh_timeout(self, first=False):
+        self.__refresh_metadata()
+        if first:
+            GObject.timeout_add_seconds(
+                REFRESH_CHECK_INTERVAL, self.__refresh_timeout,
+                priority=GObject.PRIORITY_LOW)
+            return False
+        return True
+
+    def start_refresh_timer(self):
+        """ start the background metadata refresh timer. """
+        if not CONFIG.conf.background_refresh:
+            logger.debug('Background metadata refresh is disabled')
+            return
+        logger.debug('Starting delayed metadata refresh timer')
+        GObject.timeout_add_seconds(DELAYED_START, self.__refresh_timeout,
+                                    True, priority=GObject.PRIORITY_LOW)
+
     def __on_notify_action(self, notification, action):
         """Handle notification actions. """
         logger.debug('notify-action: %s', action)
@@ -275,6 +355,7 @@ class UpdateApplication(Gio.Application):
             self.__updater.startup_init_update_timer()
         else:
             self.__updater.start_update_timer()
+        self.__updater.start_refresh_timer()
         signals = [SIGINT, SIGTERM, SIGHUP]
         for signal in signals:
             GLib.unix_signal_add_full(GLib.PRIORITY_HIGH, signal,
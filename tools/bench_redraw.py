@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#    Yum Exteder (yumex) - A graphic package management tool
+#    Copyright (C) 2013 -2014 Tim Lauridsen < timlau<AT>fedoraproject<DOT>org >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+
+"""
+Measure the cost of redrawing the package view while scrolling
+
+Usage:
+    tools/bench_redraw.py [--rows N] [--frames N]
+
+A PackageView is filled with fake packages and drawn into an offscreen
+cairo surface for each scroll position. Needs a display (or Xvfb).
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gtk  # noqa
+import cairo  # noqa
+
+TOPDIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(TOPDIR, 'src'))
+
+import yumex.gui.views as views  # noqa
+from yumex.dnf_backend import DnfPackage  # noqa
+from yumex.misc import doGtkEvents  # noqa
+
+ACTIONS = ['u', 'i', 'r', 'o', 'do']
+REPOS = ['fedora', 'updates', '@System', 'updates-testing']
+
+
+class QueueViewStub:
+    """The PackageView only needs the queue."""
+    queue = views.PackageQueue()
+
+    def refresh(self):
+        pass
+
+
+def make_packages(num):
+    pkgs = []
+    for i in range(num):
+        pkg_id = 'package-%05d,0,%d.%d,%d.fc24,x86_64,%s' % (
+            i, i % 7, i % 13, i % 5, REPOS[i % len(REPOS)])
+        values = (pkg_id, 'Summary of package number %d' % i, i * 1024)
+        pkgs.append(DnfPackage(values, ACTIONS[i % len(ACTIONS)], None))
+    return pkgs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PackageView redraw bench')
+    parser.add_argument('--rows', type=int, default=10000,
+                        help='number of packages in the view')
+    parser.add_argument('--frames', type=int, default=200,
+                        help='number of scroll positions to draw')
+    args = parser.parse_args()
+
+    view = views.PackageView(QueueViewStub())
+    sw = Gtk.ScrolledWindow()
+    sw.add(view)
+    win = Gtk.Window()
+    win.set_default_size(1000, 800)
+    win.add(sw)
+    win.show_all()
+    t_start = time.perf_counter()
+    view.populate(make_packages(args.rows))
+    populate_time = time.perf_counter() - t_start
+    doGtkEvents()
+
+    alloc = view.get_allocation()
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32,
+                                 alloc.width, alloc.height)
+    ctx = cairo.Context(surface)
+    adj = sw.get_vadjustment()
+    step = (adj.get_upper() - adj.get_page_size()) / args.frames
+    times = []
+    for frame in range(args.frames):
+        adj.set_value(frame * step)
+        doGtkEvents()
+        t_start = time.perf_counter()
+        view.draw(ctx)
+        times.append(time.perf_counter() - t_start)
+    times.sort()
+    print('rows     : %d' % args.rows)
+    print('populate : %.1f ms' % (populate_time * 1000))
+    print('redraw   : mean %.2f ms, median %.2f ms, p95 %.2f ms' % (
+        statistics.mean(times) * 1000, statistics.median(times) * 1000,
+        times[int(len(times) * 0.95)] * 1000))
+
+
+if __name__ == '__main__':
+    main()
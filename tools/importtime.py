@@ -0,0 +1,178 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#    Yum Exteder (yumex) - A graphic package management tool
+#    Copyright (C) 2013 -2014 Tim Lauridsen < timlau<AT>fedoraproject<DOT>org >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Show the import time of the yumex package (python3 -X importtime)
+and the time until the main window is shown.
+
+Usage:
+    tools/importtime.py [--top N] [--runs N] [--ref GITREV] [--no-window]
+
+With --ref the same report is made for the given git revision, so the
+gain/loss of the current tree can be seen.
+
+The time-to-window is taken from the startup timeline of
+'yumex-dnf --benchmark-startup', so it needs a display and a running
+dnf daemon, and --ref must have the 'window-shown' milestone.
+Use --no-window to only report the import time.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+TOPDIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def run_importtime(srcdir):
+    """Import yumex in a fresh interpreter, return {module: (self, cumulative)}
+    in microseconds.
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = srcdir
+    cmd = [sys.executable, '-X', 'importtime', '-c', 'import yumex']
+    proc = subprocess.run(cmd, env=env, stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE, universal_newlines=True)
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        sys.exit('import of yumex failed in %s' % srcdir)
+    result = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        result[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+    return result
+
+
+def measure(srcdir, runs):
+    """Return the run with the lowest total import time."""
+    best = None
+    for _ in range(runs):
+        result = run_importtime(srcdir)
+        if best is None or total(result) < total(best):
+            best = result
+    return best
+
+
+def total(result):
+    return result.get('yumex', (0, 0))[1]
+
+
+def run_startup(srcdir):
+    """Start yumex with --benchmark-startup, return {milestone: seconds}."""
+    cmd = [sys.executable, os.path.join(srcdir, 'main.py'),
+           '--benchmark-startup']
+    proc = subprocess.run(cmd, cwd=srcdir, stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE, universal_newlines=True)
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        sys.exit('yumex --benchmark-startup failed in %s' % srcdir)
+    # the timeline is the json object at the end of the output
+    output = proc.stdout[proc.stdout.index('{'):]
+    return {milestone['name']: milestone['time']
+            for milestone in json.loads(output)['milestones']}
+
+
+def measure_startup(srcdir, runs):
+    """Return the run with the lowest time-to-window."""
+    best = None
+    for _ in range(runs):
+        result = run_startup(srcdir)
+        if best is None or window_time(result) < window_time(best):
+            best = result
+    return best
+
+
+def window_time(result):
+    return result.get('window-shown', 0.0)
+
+
+def export_rev(rev, destdir):
+    """Export the src dir from a git revision to destdir."""
+    archive = subprocess.Popen(['git', 'archive', rev, 'src'], cwd=TOPDIR,
+                               stdout=subprocess.PIPE)
+    subprocess.check_call(['tar', '-x', '-C', destdir], stdin=archive.stdout)
+    archive.wait()
+    return os.path.join(destdir, 'src')
+
+
+def report(title, result, top):
+    print('%s : %.1f ms' % (title, total(result) / 1000.0))
+    ranked = sorted(result.items(), key=lambda x: x[1][1], reverse=True)
+    for name, (self_us, cum_us) in ranked[:top]:
+        print('  %-40s %8.1f ms %8.1f ms' % (name, cum_us / 1000.0,
+                                             self_us / 1000.0))
+
+
+def report_startup(title, result):
+    print('%s : window shown after %.1f ms' % (title,
+                                                window_time(result) * 1000))
+    for name, secs in sorted(result.items(), key=lambda x: x[1]):
+        print('  %-40s %8.1f ms' % (name, secs * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='yumex import time report')
+    parser.add_argument('--top', type=int, default=15,
+                        help='number of modules to show')
+    parser.add_argument('--runs', type=int, default=5,
+                        help='number of runs (best run is used)')
+    parser.add_argument('--ref', help='git revision to compare with')
+    parser.add_argument('--no-window', action='store_true',
+                        help='only the import time, not the time-to-window')
+    args = parser.parse_args()
+    srcdirs = [('current tree', os.path.join(TOPDIR, 'src'))]
+    tmpdir = None
+    if args.ref:
+        tmpdir = tempfile.mkdtemp(prefix='yumex-importtime-')
+        srcdirs.append((args.ref, export_rev(args.ref, tmpdir)))
+    try:
+        print('%-42s %11s %11s' % ('', 'cumulative', 'self'))
+        imports = []
+        for title, srcdir in srcdirs:
+            imports.append(measure(srcdir, args.runs))
+            report(title, imports[-1], args.top)
+        if args.ref:
+            print('import gain : %.1f ms' %
+                  ((total(imports[1]) - total(imports[0])) / 1000.0))
+        if args.no_window:
+            return
+        windows = []
+        for title, srcdir in srcdirs:
+            windows.append(measure_startup(srcdir, args.runs))
+            report_startup(title, windows[-1])
+        if args.ref:
+            print('time-to-window gain : %.1f ms' %
+                  ((window_time(windows[1]) - window_time(windows[0])) *
+                   1000))
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
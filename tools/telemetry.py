@@ -0,0 +1,111 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#    Yum Exteder (yumex) - A graphic package management tool
+#    Copyright (C) 2013 -2014 Tim Lauridsen < timlau<AT>fedoraproject<DOT>org >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Summary of the yumex transaction timing (telemetry.jsonl in the yumex
+config dir, see yumex/telemetry.py)
+
+Usage:
+    tools/telemetry.py [--file FILE]
+
+This doesn't import the yumex package, so it runs without Gtk and
+dnfdaemon.
+"""
+
+import argparse
+import json
+import os.path
+
+# keep in sync with yumex/telemetry.py
+TELEMETRY_FILE = 'telemetry.jsonl'
+PHASES = ['start-run', 'download', 'signature-check', 'run-test-transaction',
+          'run-transaction', 'verify']
+
+
+def get_path():
+    return os.path.join(os.environ['HOME'], '.config', 'yumex-dnf',
+                        TELEMETRY_FILE)
+
+
+def read(path):
+    """Read the telemetry records."""
+    records = []
+    with open(path) as fp:
+        for line in fp:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue  # partly written line
+    return records
+
+
+def percentile(values, pct):
+    """Nearest rank percentile of a sorted list."""
+    rank = max(int(round(pct / 100.0 * len(values))), 1)
+    return values[min(rank, len(values)) - 1]
+
+
+def summary(records):
+    """Get the summary lines for the telemetry records."""
+    columns = {'total': [], 'depsolve': []}
+    for phase in PHASES:
+        columns[phase] = []
+    bound = {}  # the longest phase -> number of transactions
+    for rec in records:
+        for name in ('total', 'depsolve'):
+            if rec.get(name) is not None:
+                columns[name].append(rec[name])
+        phases = rec.get('phases', {})
+        for phase, secs in phases.items():
+            columns.setdefault(phase, []).append(secs)
+        if phases:
+            longest = max(phases, key=phases.get)
+            bound[longest] = bound.get(longest, 0) + 1
+    lines = ['%d transactions' % len(records),
+             '%-22s %6s %8s %8s %8s %8s' % ('phase (seconds)', 'count',
+                                            'p50', 'p90', 'p99', 'max')]
+    for name in ['total', 'depsolve'] + PHASES:
+        values = sorted(columns.get(name, []))
+        if not values:
+            continue
+        lines.append('%-22s %6d %8.2f %8.2f %8.2f %8.2f' % (
+            name, len(values), percentile(values, 50),
+            percentile(values, 90), percentile(values, 99), values[-1]))
+    if bound:
+        lines.append('longest phase :')
+        for phase, count in sorted(bound.items(), key=lambda x: -x[1]):
+            lines.append('  %-20s %d' % (phase, count))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Summary of the yumex transaction timing')
+    parser.add_argument('--file', help='telemetry file (default: %s)' %
+                        get_path())
+    args = parser.parse_args()
+    path = args.file or get_path()
+    if not os.path.exists(path):
+        raise SystemExit('no telemetry found : %s' % path)
+    print('\n'.join(summary(read(path))))
+
+
+if __name__ == '__main__':
+    main()